@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+ab_cache.py
+On-disk cache of the colorization network's low-resolution ab output.
+- Keys are the SHA-256 of the network input (L_rs, at whatever size it was
+  resized to, so --dnn-size settings never share entries) plus the identity
+  (name, size, modification time) of the model files and the backend/precision
+  tag, so a changed model or inference setup never returns stale colours
+- Entries are small .npy files written through a temporary file and os.replace,
+  so concurrent batch workers can share one cache directory
+- Hits refresh the file's modification time; when the cache grows past max_bytes
+  the least recently used entries are deleted
+- Hit, miss, store and eviction counts are kept per process. The directory's
+  size is re-read from disk after every RESCAN_FRACTION of max_bytes stored, so
+  workers sharing it see each other's entries and the limit holds for all of them
+
+Use it through ColorizationModel.use_cache, or assign an instance keyed on the
+model files and backend/precision in use:
+    colorizer.cache = ABCache("~/.cache/colorize", max_bytes=1 << 30,
+                              model_files=colorizer.model_files(), tag=colorizer.describe())
+"""
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+# Share of max_bytes a process stores between rescans of the directory's size
+RESCAN_FRACTION = 0.05
+
+class ABCache:
+    def __init__(self, directory, max_bytes=1 << 30, model_files=(), tag=""):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.stores = self.evicted = 0
+        self._model_id = self._identify(model_files, tag)
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+        self._unscanned = 0
+
+    @staticmethod
+    def _identify(model_files, tag=""):
+        h = hashlib.sha256(tag.encode())
+        for path in model_files:
+            try:
+                st = os.stat(path)
+                h.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns};".encode())
+            except OSError:
+                h.update(f"{os.path.basename(path)}:missing;".encode())
+        return h.digest()
+
+    def key(self, L_rs):
+        h = hashlib.sha256(self._model_id)
+        h.update(f"{L_rs.dtype}{L_rs.shape}".encode())
+        h.update(np.ascontiguousarray(L_rs).data)
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".npy")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            ab = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            # Missing, evicted by another worker, or a partial file from a killed run
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ab
+
+    def put(self, key, ab):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(ab, dtype=np.float32))
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        self.stores += 1
+        size = os.path.getsize(path)
+        self._size += size
+        self._unscanned += size
+        if self._size > self.max_bytes or self._unscanned > self.max_bytes * RESCAN_FRACTION:
+            # Other processes' stores only show up on disk
+            self._size = sum(size for _, size, _ in self._entries())
+            self._unscanned = 0
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def _entries(self):
+        """Yield (path, size, mtime) for every cached entry"""
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".npy"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, st.st_size, st.st_mtime
+
+    def evict(self, target=None):
+        """Delete least recently used entries until the cache is below target
+        (default 90% of max_bytes, so eviction does not run on every store)"""
+        target = int(self.max_bytes * 0.9) if target is None else target
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                self.evicted += 1
+            except OSError:
+                pass
+            total -= size
+        self._size = total
+
+    def clear(self):
+        self.evict(target=0)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def counts(self):
+        return {"hits": self.hits, "misses": self.misses, "stores": self.stores, "evicted": self.evicted}
+
+    def summary(self):
+        return (f"ab cache: {self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate), "
+                f"{self.evicted} evicted, {self._size / 2**20:.1f} MB in {self.directory}")
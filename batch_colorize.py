@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+batch_colorize.py
+Headless batch processing of image folders, no display required.
+- Inputs are directories and/or glob patterns
+- An ordered pipeline spec (see pipeline.py) is applied to every image
+- Work is spread over a process pool; each worker loads the colorization model once
+- Finished outputs are skipped, so an interrupted run can simply be restarted
+- With --cache-dir, network outputs are cached on disk (see ab_cache.py), so
+  reruns with different enhancement settings skip the forward pass
+- --dnn-size and --ab-upsample trade deep colorization speed for quality
+- --dataset-window first collects grey level statistics over all inputs
+  (see dataset_stats.py) and then maps every image through the same window,
+  so pseudocolors are comparable between images
+- Pipelines that only pseudocolor keep 16-bit inputs at full depth: the window
+  is applied inside the colormap lookup instead of through an 8-bit copy
+- With one worker, reads are prefetched and writes run in the background
+  (see image_io.py); the summary shows how long processing waited on I/O
+
+Example:
+    python batch_colorize.py scans/ -o colorized/ -p "clahe:3.0,deep,sat:1.3"
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from dataset_stats import GrayHistogram, collect_histogram, parse_percentiles
+from image_io import AsyncWriter, PrefetchLoader, read_flags, read_image, write_atomic, write_params
+from pipeline import OPERATIONS, CompiledPipeline, keeps_depth, parse_pipeline, uses_dnn
+from pseudo_color_app_enhanced import AB_UPSAMPLE_MODES, WINDOW_PERCENTILES, colorizer, set_deep_defaults
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+# ---------------------------
+# Input discovery
+# ---------------------------
+def glob_root(pattern):
+    """Directory part of a glob pattern before its first wildcard"""
+    parts = []
+    for part in os.path.normpath(pattern).split(os.sep)[:-1]:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or "."
+
+def collect_jobs(inputs, output_dir, recursive=False, ext=".png"):
+    """Return a sorted list of (source, destination) pairs. Destinations mirror the
+    paths below each directory or glob root; sources that differ only in their
+    extension (x.png, x.jpg) keep it in the name (x_png.png, x_jpg.png)."""
+    jobs = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                if not recursive:
+                    dirs[:] = []
+                for name in files:
+                    if name.lower().endswith(IMAGE_EXTS):
+                        src = os.path.join(root, name)
+                        rel = os.path.relpath(src, item)
+                        jobs[os.path.abspath(src)] = os.path.join(output_dir, os.path.splitext(rel)[0] + ext)
+        else:
+            root = glob_root(item)
+            for src in glob.glob(item, recursive=recursive):
+                if os.path.isfile(src) and src.lower().endswith(IMAGE_EXTS):
+                    rel = os.path.relpath(src, root)
+                    jobs[os.path.abspath(src)] = os.path.join(output_dir, os.path.splitext(rel)[0] + ext)
+    for sources in duplicate_destinations(jobs.items()).values():
+        if len({os.path.splitext(src)[1].lower() for src in sources}) < len(sources):
+            continue    # Same name and extension: reported by the caller
+        for src in sources:
+            stem, src_ext = os.path.splitext(jobs[src])[0], os.path.splitext(src)[1]
+            jobs[src] = f"{stem}_{src_ext[1:].lower()}{ext}"
+    return sorted(jobs.items())
+
+def duplicate_destinations(jobs):
+    """{destination: [sources]} for destinations more than one source would write"""
+    sources = {}
+    for src, dst in jobs:
+        sources.setdefault(os.path.normcase(os.path.abspath(dst)), []).append(src)
+    return {dst: srcs for dst, srcs in sources.items() if len(srcs) > 1}
+
+def is_done(dst):
+    return os.path.exists(dst) and os.path.getsize(dst) > 0
+
+def starts_gray(steps):
+    """True when the first operation only looks at grayscale, so images can be decoded as gray"""
+    return OPERATIONS[steps[0][0]][1] == "gray"
+
+# ---------------------------
+# Worker side
+# ---------------------------
+_steps = None
+_plan = None
+_io = {"flags": read_flags(), "window": None, "keep_depth": False, "png_compression": None, "jpeg_quality": None}
+
+def init_worker(spec, threads_per_worker, cache_dir=None, cache_bytes=1 << 30, io_options=None,
+                dnn_options=None):
+    global _steps, _plan
+    set_deep_defaults(**(dnn_options or {}))
+    _steps = parse_pipeline(spec)
+    _io.update(io_options or {})
+    _plan = CompiledPipeline(_steps, window=_io["window"] if _io["keep_depth"] else None)
+    if threads_per_worker:
+        cv2.setNumThreads(threads_per_worker)
+    if cache_dir and uses_dnn(_steps):
+        colorizer.use_cache(cache_dir, cache_bytes)
+    # Non-DNN pipelines never touch the model; DNN ones load it here, once per worker
+    if uses_dnn(_steps):
+        colorizer.warmup()
+
+def cache_counts():
+    return colorizer.cache.counts() if colorizer.cache is not None else {}
+
+def run_loaded(loaded):
+    """Run the plan on [(src, dst, img)]; returns (outputs, errors). A single image's
+    output is the plan's reused buffer, which must be written (or copied) before the next call."""
+    try:
+        imgs = [img for _, _, img in loaded]
+        return ([_plan.run(imgs[0])] if len(imgs) == 1 else _plan.run_batch(imgs, len(imgs))), []
+    except Exception as e:
+        return [], [(src, str(e)) for src, _, _ in loaded]
+
+def process_chunk(jobs):
+    """Process a chunk of images; with more than one, deep colorization runs batched.
+    Returns a list of (source, error) pairs and the ab cache counts for this chunk."""
+    before = cache_counts()
+    results = []
+    loaded = []
+    for src, dst in jobs:
+        img = read_image(src, _io["flags"], _io["window"], _io["keep_depth"])
+        if img is None:
+            results.append((src, "Unable to read image"))
+        else:
+            loaded.append((src, dst, img))
+    outs, errors = run_loaded(loaded)
+    results += errors
+    for (src, dst, _), out in zip(loaded, outs):
+        try:
+            write_atomic(dst, out, write_params(dst, _io["png_compression"], _io["jpeg_quality"]))
+            results.append((src, None))
+        except Exception as e:
+            results.append((src, str(e)))
+    return results, {k: v - before[k] for k, v in cache_counts().items()}
+
+def process_streamed(chunks, prefetch, io_threads, on_chunk):
+    """In-process run with reads prefetched and writes in the background; returns the I/O summary"""
+    loader = PrefetchLoader([src for chunk in chunks for src, _ in chunk], prefetch, io_threads, _io["flags"],
+                            _io["window"], _io["keep_depth"])
+    writer = AsyncWriter(io_threads, max(prefetch, 1) * 2, _io["png_compression"], _io["jpeg_quality"])
+    images = iter(loader)
+    for chunk in chunks:
+        before = cache_counts()
+        results, loaded = [], []
+        for (src, dst), (_, img) in zip(chunk, images):
+            if img is None:
+                results.append((src, "Unable to read image"))
+            else:
+                loaded.append((src, dst, img))
+        outs, errors = run_loaded(loaded)
+        results += errors
+        for (src, dst, _), out in zip(loaded, outs):
+            # The plan reuses its output buffer for the next image
+            writer.write(dst, out.copy() if len(loaded) == 1 else out, tag=src)
+        on_chunk(results + writer.finished(), {k: v - before[k] for k, v in cache_counts().items()})
+    on_chunk(writer.close(), {})
+    return [loader.stats.describe("read", "decoded ahead"), writer.stats.describe("write", "queued")]
+
+# ---------------------------
+# Driver
+# ---------------------------
+# Operations whose output depends on each image's own contrast
+ADAPTIVE_OPERATIONS = ("ace", "clahe")
+
+def dataset_histogram(paths, workers, stats_file=None):
+    """Grey level histogram over all paths: loaded from stats_file if it exists,
+    otherwise collected (first pass) and written there"""
+    if stats_file and os.path.exists(stats_file):
+        print(f"Using grey level statistics from {stats_file}")
+        return GrayHistogram.load(stats_file)
+    print(f"Collecting grey level statistics over {len(paths)} images...", flush=True)
+    hist = collect_histogram(paths, max(workers, 1),
+                             on_error=lambda p: print(f"[ERROR] {p}: Unable to read image", file=sys.stderr))
+    if stats_file and hist.images:
+        print(f"Statistics written to {hist.save(stats_file)}")
+    return hist
+
+def run_batch(jobs, spec, workers, dnn_batch=1, report_every=50, cache_dir=None, cache_bytes=1 << 30,
+              io_options=None, prefetch=4, io_threads=2, dnn_options=None):
+    """Process jobs and return (done, failed) counts"""
+    done = failed = 0
+    cache = {}
+    io_summary = []
+    start = time.perf_counter()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        prefix = "Finished" if final else "Progress"
+        print(f"{prefix}: {done}/{len(jobs)} done, {failed} failed, "
+              f"{elapsed:.1f}s elapsed, {rate:.2f} images/s", flush=True)
+        if final and cache:
+            lookups = cache["hits"] + cache["misses"]
+            print(f"ab cache: {cache['hits']}/{lookups} hits ({cache['hits'] / max(lookups, 1):.0%}), "
+                  f"{cache['evicted']} evicted", flush=True)
+        for line in io_summary if final else ():
+            print(line, flush=True)
+
+    def on_chunk(results, counts):
+        for key, value in counts.items():
+            cache[key] = cache.get(key, 0) + value
+        for src, error in results:
+            on_result(src, error)
+
+    def on_result(src, error):
+        nonlocal done, failed
+        if error is None:
+            done += 1
+        else:
+            failed += 1
+            print(f"[ERROR] {src}: {error}", file=sys.stderr, flush=True)
+        if (done + failed) % report_every == 0:
+            report()
+
+    chunk = max(dnn_batch, 1) if uses_dnn(parse_pipeline(spec)) else 1
+    chunks = [jobs[i:i + chunk] for i in range(0, len(jobs), chunk)]
+
+    if workers <= 1:
+        init_worker(spec, 0, cache_dir, cache_bytes, io_options, dnn_options)
+        if prefetch > 0:
+            io_summary = process_streamed(chunks, prefetch, io_threads, on_chunk)
+        else:
+            for results, counts in map(process_chunk, chunks):
+                on_chunk(results, counts)
+    else:
+        # One OpenCV thread per process: the pool already occupies every core
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(spec, 1, cache_dir, cache_bytes, io_options, dnn_options)) as pool:
+            futures = {pool.submit(process_chunk, c): c for c in chunks}
+            for future in as_completed(futures):
+                try:
+                    results, counts = future.result()
+                except Exception as e:
+                    results, counts = [(src, e) for src, _ in futures[future]], {}
+                on_chunk(results, counts)
+    report(final=True)
+    return done, failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch enhance/colorize folders of images without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="input directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", required=True, help="directory for results")
+    parser.add_argument("-p", "--pipeline", default="deep",
+                        help="ordered operations, e.g. 'clahe:3.0,gamma:1.2,deep' (default: deep)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: all cores)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="descend into subdirectories")
+    parser.add_argument("--ext", default=".png", help="output file extension (default: .png)")
+    parser.add_argument("--dnn-batch", type=int, default=1,
+                        help="images per deep colorization forward pass (default: 1)")
+    parser.add_argument("--dnn-size", type=int,
+                        help="deep colorization network input size in pixels, e.g. 128 for speed, "
+                             "320 for detail (default: 224)")
+    parser.add_argument("--ab-upsample", choices=AB_UPSAMPLE_MODES,
+                        help="how network chroma is upsampled: bilinear, or guided by the "
+                             "full-resolution lightness (sharper colour edges; default: bilinear)")
+    parser.add_argument("--overwrite", action="store_true", help="reprocess images whose output already exists")
+    parser.add_argument("--cache-dir", help="directory for cached network outputs (deep pipelines only)")
+    parser.add_argument("--cache-size", type=float, default=1024, help="ab cache size limit in MB (default: 1024)")
+    parser.add_argument("--prefetch", type=int, default=4,
+                        help="images read ahead with one worker, 0 for synchronous I/O (default: 4)")
+    parser.add_argument("--io-threads", type=int, default=2, help="threads for reading and writing (default: 2)")
+    parser.add_argument("--reduce", type=int, default=1, choices=(1, 2, 4, 8),
+                        help="decode at 1/N resolution, e.g. for previews (default: 1)")
+    parser.add_argument("--gray-decode", action="store_true",
+                        help="decode straight to grayscale when the pipeline starts with ace, pseudocolor or deep "
+                             "(faster, may differ by one level from converting the color image)")
+    parser.add_argument("--dataset-window", action="store_true",
+                        help="window grey levels with statistics over all inputs instead of per image "
+                             "(consistent pseudocolors; decodes grayscale)")
+    parser.add_argument("--window-stats", metavar="FILE",
+                        help="histogram file for --dataset-window: used if it exists, else written "
+                             "(implies --dataset-window)")
+    parser.add_argument("--window-percentiles", default=",".join(str(p) for p in WINDOW_PERCENTILES),
+                        help="low,high percentiles of the dataset window (default: %(default)s)")
+    parser.add_argument("--png-compression", type=int, choices=range(10), metavar="0-9",
+                        help="PNG compression level (OpenCV default: 1)")
+    parser.add_argument("--jpeg-quality", type=int, choices=range(101), metavar="0-100",
+                        help="JPEG quality (OpenCV default: 95)")
+    args = parser.parse_args(argv)
+
+    try:
+        steps = parse_pipeline(args.pipeline)
+    except ValueError as e:
+        parser.error(str(e))
+    io_options = {
+        "flags": read_flags(args.gray_decode and starts_gray(steps), args.reduce),
+        "keep_depth": keeps_depth(steps),
+        "png_compression": args.png_compression,
+        "jpeg_quality": args.jpeg_quality,
+    }
+    dnn_options = {"size": args.dnn_size, "upsample": args.ab_upsample}
+    try:
+        set_deep_defaults(**dnn_options)
+    except ValueError as e:
+        parser.error(str(e))
+
+    ext = args.ext if args.ext.startswith(".") else "." + args.ext
+    jobs = collect_jobs(args.inputs, args.output_dir, args.recursive, ext)
+    if not jobs:
+        print("No input images found.")
+        return 1
+    duplicates = duplicate_destinations(jobs)
+    if duplicates:
+        # e.g. the same relative path below two input directories
+        for dst, sources in duplicates.items():
+            print(f"[ERROR] {dst} would be written by {len(sources)} inputs: {', '.join(sources)}",
+                  file=sys.stderr)
+        print("Rename the inputs or process them into separate output directories.")
+        return 1
+    if args.dataset_window or args.window_stats:
+        if args.reduce != 1:
+            parser.error("--dataset-window needs full-depth decoding; it cannot be combined with --reduce")
+        try:
+            percentiles = parse_percentiles(args.window_percentiles)
+        except ValueError as e:
+            parser.error(str(e))
+        # Statistics cover every input, including finished ones, so a restarted run keeps the same window
+        try:
+            hist = dataset_histogram([src for src, _ in jobs], args.workers, args.window_stats)
+        except ValueError as e:
+            print(f"[ERROR] {e}", file=sys.stderr)
+            return 1
+        if not hist.images:
+            print("No readable images.")
+            return 1
+        io_options["window"] = hist.window(percentiles)
+        io_options["flags"] = read_flags(gray=True)
+        print(f"Dataset window {io_options['window'][0]}..{io_options['window'][1]} "
+              f"({percentiles[0]}..{percentiles[1]} percentiles of {hist.images} images)")
+        adaptive = [name for name, _ in steps if name in ADAPTIVE_OPERATIONS]
+        if adaptive:
+            print(f"Note: per-image operations ({', '.join(adaptive)}) will make colours differ between images again")
+    pending = jobs if args.overwrite else [(s, d) for s, d in jobs if not is_done(d)]
+    skipped = len(jobs) - len(pending)
+    print(f"Found {len(jobs)} images, {skipped} already done, {len(pending)} to process "
+          f"with {max(args.workers, 1)} worker(s): {args.pipeline}")
+    if not pending:
+        return 0
+    _, failed = run_batch(pending, args.pipeline, args.workers, args.dnn_batch,
+                          cache_dir=args.cache_dir, cache_bytes=int(args.cache_size * 2**20),
+                          io_options=io_options, prefetch=args.prefetch, io_threads=args.io_threads,
+                          dnn_options=dnn_options)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+bench_deep_batch.py
+Throughput of deep colorization versus DNN batch size, on synthetic images.
+Compares calling deep_colorize once per image with deep_colorize_batch at
+several batch sizes. Skipped when the model files are not present.
+
+Example:
+    python bench_deep_batch.py --images 32 --sizes 1,2,4,8,16 --threads 8
+"""
+
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import pseudo_color_app_enhanced as app
+
+def synthetic_grays(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    imgs = []
+    for _ in range(count):
+        noise = rng.integers(0, 256, (height // 8, width // 8), dtype=np.uint8)
+        imgs.append(cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC))
+    return imgs
+
+def measure(func, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark deep colorization throughput vs batch size.")
+    parser.add_argument("--images", type=int, default=16, help="images per measurement (default: 16)")
+    parser.add_argument("--sizes", default="1,2,4,8,16", help="comma separated batch sizes")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--threads", type=int, default=0, help="OpenCV threads (default: OpenCV's choice)")
+    parser.add_argument("--repeats", type=int, default=2, help="best of N runs (default: 2)")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+    if not app.colorizer.warmup():
+        print("Model files not available - skipping DNN benchmark.")
+        return 0
+
+    imgs = synthetic_grays(args.images, args.width, args.height)
+    print(f"{args.images} images of {args.width}x{args.height}, {cv2.getNumThreads()} OpenCV threads")
+    print(f"{'mode':>12} {'seconds':>9} {'images/s':>9} {'speedup':>8}")
+    baseline = measure(lambda: [app.deep_colorize(g) for g in imgs], args.repeats)
+    print(f"{'per-image':>12} {baseline:9.3f} {args.images / baseline:9.2f} {1.0:8.2f}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        elapsed = measure(lambda: app.deep_colorize_batch(imgs, size), args.repeats)
+        print(f"{'batch=' + str(size):>12} {elapsed:9.3f} {args.images / elapsed:9.2f} {baseline / elapsed:8.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
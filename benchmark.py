@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+Reproducible, headless benchmark of the enhancement and colorization functions
+in pseudo_color_app_enhanced.py on synthetic images.
+- Every function is run across image sizes (VGA up to 50 MP), dtypes and channel counts;
+  combinations a function is not meant for (SUPPORTED) are skipped, and ones that fail
+  or do not return an image of the input's size are recorded as "unsupported"
+- Reports latency percentiles, throughput (MP/s) and peak RSS growth per case
+- Results are written as JSON and can be compared against a stored baseline;
+  the exit status is 1 when any case got slower than the tolerance allows
+- deep_colorize is skipped when the model files are not present
+- --check compares optimised functions against their straightforward reference
+  implementations (kept below) and fails on any pixel difference
+- --scaling times the band-splittable functions through tiling.process_parallel
+  with 1 to N worker threads and reports speedup and parallel efficiency
+- --ace-modes times ace_enhancement's exact, box and pyramid modes for several
+  window radii and reports how far box and pyramid are from exact
+
+Examples:
+    python benchmark.py --sizes vga,fhd -o bench.json
+    python benchmark.py --sizes vga,fhd --baseline bench.json --tolerance 0.15
+    python benchmark.py --check
+    python benchmark.py --scaling --sizes 24mp --workers 1,2,4,8
+    python benchmark.py --ace-modes --sizes 12mp --ace-radii 15,45,150
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import pseudo_color_app_enhanced as app
+from tiling import can_band, process_parallel
+
+SIZES = {
+    "vga": (640, 480),
+    "hd": (1280, 720),
+    "fhd": (1920, 1080),
+    "12mp": (4000, 3000),
+    "24mp": (6000, 4000),
+    "50mp": (8660, 5774),
+}
+
+# name -> (callable, extra args)
+FUNCTIONS = {
+    "ace_enhancement": (app.ace_enhancement, (2.0,)),
+    "clahe_enhancement": (app.clahe_enhancement, (2.5,)),
+    "gamma_correction": (app.gamma_correction, (1.5,)),
+    "sharpen": (app.sharpen, ()),
+    "saturation_boost": (app.saturation_boost, (1.4,)),
+    "pseudocolor": (app.pseudocolor, (cv2.COLORMAP_JET,)),
+    "deep_colorize": (app.deep_colorize, ()),
+}
+
+DTYPES = {"uint8": np.uint8, "uint16": np.uint16}
+# Inputs each function is meant for: (dtypes, channels); other cases are skipped
+SUPPORTED = {
+    "ace_enhancement": (("uint8",), (1,)),
+    "clahe_enhancement": (("uint8",), (3,)),
+    "gamma_correction": (("uint8",), (1, 3)),
+    "sharpen": (("uint8", "uint16"), (1, 3)),
+    "saturation_boost": (("uint8",), (3,)),
+    "pseudocolor": (("uint8", "uint16"), (1,)),
+    "deep_colorize": (("uint8",), (1,)),
+}
+# Channels of the scaling test image per function (default 3)
+SCALING_CHANNELS = {"ace_enhancement": 1, "pseudocolor": 1}
+# Arguments for the scaling test where FUNCTIONS' are not band-splittable
+SCALING_ARGS = {"pseudocolor": (cv2.COLORMAP_JET, (0, 255))}
+
+# ---------------------------
+# Reference implementations
+# ---------------------------
+def saturation_boost_reference(img, factor=1.3):
+    """The original HSV split/float32/merge version of saturation_boost"""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    h,s,v = cv2.split(hsv)
+    s = np.clip(s.astype(np.float32) * factor, 0, 255).astype(np.uint8)
+    boosted = cv2.merge([h,s,v])
+    return cv2.cvtColor(boosted, cv2.COLOR_HSV2BGR)
+
+def saturation_boost_in_place(img, factor):
+    out = img.copy()
+    result = app.saturation_boost(out, factor, out=out)
+    assert result is out, "out= buffer was not used"
+    return result
+
+def banded(func, workers=3, band_rows=97):
+    """func split into small bands on a thread pool, so the halos are exercised"""
+    def run(img, *args):
+        return process_parallel(func, img, *args, workers=workers, band_rows=band_rows)
+    return run
+
+# name -> (optimised, reference, parameters to try, channels)
+EQUIVALENCE = {
+    "saturation_boost": (app.saturation_boost, saturation_boost_reference, (0.0, 0.5, 1.0, 1.3, 2.7), 3),
+    "saturation_boost(out=img)": (saturation_boost_in_place, saturation_boost_reference, (0.5, 1.3, 2.7), 3),
+    "ace_enhancement(parallel bands)": (banded(app.ace_enhancement), app.ace_enhancement, (0.5, 2.0), 1),
+    "gamma_correction(parallel bands)": (banded(app.gamma_correction), app.gamma_correction, (0.5, 1.5), 3),
+    "saturation_boost(parallel bands)": (banded(app.saturation_boost), app.saturation_boost, (1.3,), 3),
+    "sharpen(parallel bands)": (lambda img, _: banded(app.sharpen)(img), lambda img, _: app.sharpen(img), (None,), 3),
+    "pseudocolor(parallel bands)": (lambda img, w: banded(app.pseudocolor)(img, cv2.COLORMAP_JET, w),
+                                    lambda img, w: app.pseudocolor(img, cv2.COLORMAP_JET, w), ((0, 255), (40, 200)), 1),
+}
+
+def check_equivalence(sizes=((640, 480), (1921, 1079), (7, 5)), log=print):
+    """Return the number of (function, size, parameter) cases that differ from the reference"""
+    failures = 0
+    for name, (func, reference, params, channels) in EQUIVALENCE.items():
+        before = failures
+        for width, height in sizes:
+            # Random pixels cover every hue/saturation combination, unlike smooth textures
+            shape = (height, width) + ((channels,) if channels > 1 else ())
+            img = np.random.default_rng(width).integers(0, 256, shape, dtype=np.uint8)
+            for param in params:
+                diff = cv2.absdiff(func(img, param), reference(img, param)).max()
+                if diff:
+                    failures += 1
+                    log(f"[MISMATCH] {name} {width}x{height} param {param}: max difference {diff}")
+        log(f"{name:<42} {'identical' if failures == before else 'FAILED'}")
+    return failures
+
+# ---------------------------
+# Measurement helpers
+# ---------------------------
+def synthetic_image(width, height, channels, dtype, seed=0, grain=0):
+    """Smooth random texture, so filters and codecs see image-like content;
+    grain adds fine noise of up to that many grey levels (film or sensor noise)"""
+    rng = np.random.default_rng(seed)
+    shape = (max(height // 16, 2), max(width // 16, 2)) + ((channels,) if channels > 1 else ())
+    small = rng.integers(0, 256, shape, dtype=np.uint8)
+    img = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    if grain:
+        img = cv2.add(img, rng.integers(0, grain, img.shape, dtype=np.uint8))
+    if dtype == np.uint16:
+        img = img.astype(np.uint16) * 257
+    return img
+
+def current_rss():
+    """Resident set size in bytes, or None where it cannot be read cheaply"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+class RssSampler:
+    """Samples RSS on a background thread and records the peak growth over the start value"""
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak_delta = None
+
+    def __enter__(self):
+        self._start = current_rss()
+        self._peak = self._start
+        self._stop = threading.Event()
+        if self._start is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, current_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._start is not None:
+            self._thread.join()
+            self._peak = max(self._peak, current_rss())
+            self.peak_delta = self._peak - self._start
+
+def percentile(values, q):
+    return float(np.percentile(values, q))
+
+def check_output(img, out):
+    """Reject results that are not an image of the input's size (e.g. a colormap
+    applied per channel), so they are not timed as if they were valid"""
+    if out.shape[:2] != img.shape[:2] or out.ndim > 3:
+        raise ValueError(f"unexpected output shape {out.shape} for input {img.shape}")
+
+def run_case(func, args, img, repeats, warmup=1):
+    for _ in range(warmup):
+        check_output(img, func(img, *args))
+    times = []
+    with RssSampler() as rss:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func(img, *args)
+            times.append(time.perf_counter() - start)
+    mp = img.shape[0] * img.shape[1] / 1e6
+    return {
+        "p50_ms": percentile(times, 50) * 1e3,
+        "p90_ms": percentile(times, 90) * 1e3,
+        "p99_ms": percentile(times, 99) * 1e3,
+        "mean_ms": float(np.mean(times)) * 1e3,
+        "mp_per_s": mp / percentile(times, 50),
+        "peak_rss_mb": None if rss.peak_delta is None else rss.peak_delta / 2**20,
+    }
+
+# ---------------------------
+# Suite
+# ---------------------------
+def case_key(case):
+    return f"{case['function']}/{case['size']}/{case['dtype']}/{case['channels']}ch"
+
+def run_suite(functions, sizes, dtypes, channels, repeats, log=print):
+    dnn_available = app.colorizer.files_present() and app.colorizer.warmup()
+    results = []
+    for size in sizes:
+        width, height = SIZES[size]
+        for dtype in dtypes:
+            for ch in channels:
+                img = synthetic_image(width, height, ch, DTYPES[dtype])
+                for name in functions:
+                    func, args = FUNCTIONS[name]
+                    case = {"function": name, "size": size, "width": width, "height": height,
+                            "dtype": dtype, "channels": ch}
+                    dtypes_ok, channels_ok = SUPPORTED[name]
+                    if dtype not in dtypes_ok or ch not in channels_ok:
+                        case.update(status="skipped", reason=f"not meant for {dtype} {ch}-channel input")
+                    elif name == "deep_colorize" and not dnn_available:
+                        case.update(status="skipped", reason="model files not present")
+                    else:
+                        try:
+                            case.update(status="ok", **run_case(func, args, img, repeats))
+                        except (cv2.error, ValueError, TypeError) as e:
+                            case.update(status="unsupported", reason=str(e).strip().splitlines()[-1][:200])
+                    results.append(case)
+                    log(format_case(case))
+    return results
+
+def run_scaling(functions, sizes, workers_list, repeats, log=print):
+    """Time each band-splittable function with every worker count; speedup is
+    relative to the first count (normally 1)"""
+    results = []
+    for size in sizes:
+        width, height = SIZES[size]
+        for name in functions:
+            func, args = FUNCTIONS[name]
+            args = SCALING_ARGS.get(name, args)
+            if not can_band(func, *args):
+                continue
+            img = synthetic_image(width, height, SCALING_CHANNELS.get(name, 3), np.uint8)
+            base = None
+            for workers in workers_list:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    case = run_case(lambda im, *a: process_parallel(func, im, *a, workers=workers, executor=pool),
+                                    args, img, repeats)
+                base = base or case["p50_ms"] * workers_list[0]
+                case.update(function=name, size=size, workers=workers, speedup=base / case["p50_ms"],
+                            efficiency=base / case["p50_ms"] / workers)
+                results.append(case)
+                log(f"{name + '/' + size:<30} {workers:>3} workers  p50 {case['p50_ms']:9.2f} ms  "
+                    f"{case['mp_per_s']:8.1f} MP/s  speedup {case['speedup']:5.2f}x  "
+                    f"efficiency {case['efficiency']:4.0%}")
+    return results
+
+def run_ace_modes(sizes, radii, repeats, strength=2.0, log=print):
+    """Time every ace_enhancement mode per radius; errors are grey levels against the exact mode"""
+    results = []
+    for size in sizes:
+        width, height = SIZES[size]
+        img = synthetic_image(width, height, 1, np.uint8, grain=24)
+        for radius in radii:
+            reference = app.ace_enhancement(img, strength, radius, "exact")
+            for mode in app.ACE_MODES:
+                case = run_case(app.ace_enhancement, (strength, radius, mode), img, repeats)
+                diff = cv2.absdiff(app.ace_enhancement(img, strength, radius, mode), reference)
+                case.update(size=size, radius=radius, mode=mode, mean_error=float(diff.mean()),
+                            p99_error=percentile(diff, 99), max_error=int(diff.max()))
+                results.append(case)
+                log(f"{size:<6} r={radius:<4} {mode:<8} p50 {case['p50_ms']:9.2f} ms  "
+                    f"{case['mp_per_s']:8.1f} MP/s  error mean {case['mean_error']:.3f} "
+                    f"p99 {case['p99_error']:.0f} max {case['max_error']}")
+    return results
+
+def format_case(case):
+    label = f"{case_key(case):<42}"
+    if case["status"] != "ok":
+        return f"{label} {case['status']}"
+    rss = "n/a" if case["peak_rss_mb"] is None else f"{case['peak_rss_mb']:.1f}"
+    return (f"{label} p50 {case['p50_ms']:9.2f} ms  p99 {case['p99_ms']:9.2f} ms  "
+            f"{case['mp_per_s']:8.1f} MP/s  +RSS {rss} MB")
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(results, baseline, tolerance):
+    """Return a list of (key, old p50, new p50) for cases slower than the tolerance"""
+    old = {case_key(c): c for c in baseline.get("results", []) if c.get("status") == "ok"}
+    regressions = []
+    for case in results:
+        prev = old.get(case_key(case))
+        if case["status"] == "ok" and prev is not None and case["p50_ms"] > prev["p50_ms"] * (1 + tolerance):
+            regressions.append((case_key(case), prev["p50_ms"], case["p50_ms"]))
+    return regressions
+
+def write_report(path, report):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {path}")
+
+def split_arg(value, choices, option):
+    items = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in items if v not in choices]
+    if unknown:
+        raise SystemExit(f"{option}: unknown {', '.join(unknown)} (choose from {', '.join(choices)})")
+    return items
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the enhancement and colorization functions.")
+    parser.add_argument("--sizes", default="vga,hd,fhd", help=f"comma separated, from {','.join(SIZES)} or 'all'")
+    parser.add_argument("--functions", default="all", help="comma separated function names (default: all)")
+    parser.add_argument("--dtypes", default="uint8,uint16")
+    parser.add_argument("--channels", default="1,3")
+    parser.add_argument("--repeats", type=int, default=10, help="timed runs per case (default: 10)")
+    parser.add_argument("--threads", type=int, default=0, help="OpenCV threads (default: OpenCV's choice)")
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed p50 slowdown vs baseline before failing (default: 0.15)")
+    parser.add_argument("--scaling", action="store_true",
+                        help="measure parallel band execution with 1 to N threads instead of the suite")
+    parser.add_argument("--workers", help="worker counts for --scaling (default: 1,2,4,... up to the core count)")
+    parser.add_argument("--ace-modes", action="store_true",
+                        help="compare ace_enhancement's modes for --ace-radii instead of the suite")
+    parser.add_argument("--ace-radii", default="15,45,150", help="window radii for --ace-modes (default: 15,45,150)")
+    parser.add_argument("--check", action="store_true",
+                        help="only verify optimised functions against their reference implementations")
+    args = parser.parse_args(argv)
+    if args.check:
+        return 1 if check_equivalence() else 0
+
+    sizes = list(SIZES) if args.sizes == "all" else split_arg(args.sizes, SIZES, "--sizes")
+    functions = list(FUNCTIONS) if args.functions == "all" else split_arg(args.functions, FUNCTIONS, "--functions")
+    dtypes = split_arg(args.dtypes, DTYPES, "--dtypes")
+    channels = [int(c) for c in split_arg(args.channels, ("1", "3"), "--channels")]
+    if args.scaling:
+        # OpenCV's own threads would compete with the band workers
+        cv2.setNumThreads(args.threads or 1)
+        workers = ([int(w) for w in args.workers.split(",")] if args.workers
+                   else sorted({min(2**i, os.cpu_count() or 1) for i in range((os.cpu_count() or 1).bit_length() + 1)}))
+        scaling = run_scaling(functions, sizes, workers, args.repeats)
+        report = {"environment": environment(), "repeats": args.repeats, "scaling": scaling}
+        if args.output:
+            write_report(args.output, report)
+        return 0
+    if args.ace_modes:
+        try:
+            radii = [int(r) for r in args.ace_radii.split(",")]
+        except ValueError:
+            parser.error(f"--ace-radii: expected comma separated integers, got {args.ace_radii}")
+        if min(radii) < 1:
+            parser.error("--ace-radii must all be at least 1")
+        if args.threads:
+            cv2.setNumThreads(args.threads)
+        ace_modes = run_ace_modes(sizes, radii, args.repeats)
+        report = {"environment": environment(), "repeats": args.repeats, "ace_modes": ace_modes}
+        if args.output:
+            write_report(args.output, report)
+        return 0
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+
+    results = run_suite(functions, sizes, dtypes, channels, args.repeats)
+    report = {"environment": environment(), "repeats": args.repeats, "results": results}
+    if args.output:
+        write_report(args.output, report)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for key, old, new in regressions:
+            print(f"[REGRESSION] {key}: p50 {old:.2f} ms -> {new:.2f} ms ({new / old - 1:+.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+colorize_server.py
+Small local HTTP service for the enhancement and colorization functions (no GUI).
+- POST /process?pipeline=clahe,deep&format=png with an encoded image as the body;
+  the response is the processed image in the requested format
+- GET /health and GET /stats return JSON
+- Deep colorization requests arriving within --batch-window ms of each other are
+  coalesced into one forward pass of up to --max-batch images
+- Decoding, enhancement and encoding run in a thread pool off the event loop;
+  the model is loaded once when the server starts
+
+Example:
+    python colorize_server.py --port 8765 &
+    curl --data-binary @scan.png "http://127.0.0.1:8765/process?pipeline=clahe,deep" -o out.png
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+from pipeline import as_kind, parse_pipeline, run_pipeline
+import pseudo_color_app_enhanced as app
+
+MAX_BODY = 256 * 2**20
+# format -> (extension for cv2.imencode, content type)
+FORMATS = {
+    "png": (".png", "image/png"),
+    "jpg": (".jpg", "image/jpeg"),
+    "jpeg": (".jpg", "image/jpeg"),
+    "bmp": (".bmp", "image/bmp"),
+    "tif": (".tif", "image/tiff"),
+    "tiff": (".tif", "image/tiff"),
+}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# ---------------------------
+# DNN micro-batching
+# ---------------------------
+class MicroBatcher:
+    """Collects grayscale images for deep colorization and runs them in batches.
+    A batch starts with the first waiting image and closes after window seconds
+    or when max_batch images are waiting, whichever comes first."""
+    def __init__(self, executor, window=0.01, max_batch=8):
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.images = 0
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def colorize(self, gray):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((gray, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            grays = [gray for gray, _ in batch]
+            try:
+                outs = await loop.run_in_executor(self.executor, app.deep_colorize_batch, grays)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.images += len(batch)
+            for (_, future), out in zip(batch, outs):
+                if not future.done():
+                    future.set_result(out)
+
+    def close(self):
+        self._task.cancel()
+
+# ---------------------------
+# Service
+# ---------------------------
+class ColorizeService:
+    def __init__(self, workers=4, batch_window=0.01, max_batch=8):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cpu")
+        # The network runs one batch at a time anyway; a dedicated thread keeps it
+        # from occupying the CPU pool
+        self.dnn_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dnn")
+        self.batcher = MicroBatcher(self.dnn_pool, batch_window, max_batch)
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+
+    async def process(self, body, spec, ext):
+        loop = asyncio.get_running_loop()
+        try:
+            steps = parse_pipeline(spec)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        img = await loop.run_in_executor(self.pool, decode, body)
+        if img is None:
+            raise HTTPError(400, "Request body is not a decodable image")
+        # Split the pipeline at deep steps: CPU segments go to the pool, deep to the batcher
+        segment = []
+        for name, param in steps + [(None, None)]:
+            if name == "deep" or name is None:
+                if segment:
+                    img = await loop.run_in_executor(self.pool, run_pipeline, segment, img)
+                    segment = []
+                if name == "deep":
+                    img = await self.batcher.colorize(as_kind(img, "gray"))
+            else:
+                segment.append((name, param))
+        return await loop.run_in_executor(self.pool, encode, img, ext)
+
+    def stats(self):
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "model_loaded": app.colorizer.loaded and app.colorizer.get() is not None,
+            "dnn_batches": self.batcher.batches,
+            "dnn_images": self.batcher.images,
+            "mean_dnn_batch": round(self.batcher.images / self.batcher.batches, 2) if self.batcher.batches else 0,
+        }
+
+    async def handle(self, method, path, body):
+        """Return (status, content type, payload) for one request"""
+        url = urlsplit(path)
+        if url.path in ("/health", "/stats"):
+            if method != "GET":
+                raise HTTPError(405, "Use GET")
+            return 200, "application/json", json.dumps(self.stats()).encode()
+        if url.path == "/process":
+            if method != "POST":
+                raise HTTPError(405, "Use POST with the image as the request body")
+            query = parse_qs(url.query)
+            fmt = query.get("format", ["png"])[0].lower()
+            if fmt not in FORMATS:
+                raise HTTPError(400, f"Unknown format '{fmt}' (choose from {', '.join(FORMATS)})")
+            ext, ctype = FORMATS[fmt]
+            return 200, ctype, await self.process(body, query.get("pipeline", ["deep"])[0], ext)
+        raise HTTPError(404, f"No such endpoint: {url.path}")
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    await send_response(writer, e.status, "text/plain", str(e).encode(), keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self.requests += 1
+                try:
+                    status, ctype, payload = await self.handle(method, path, body)
+                except HTTPError as e:
+                    self.errors += 1
+                    status, ctype, payload = e.status, "text/plain", str(e).encode()
+                except Exception as e:
+                    self.errors += 1
+                    status, ctype, payload = 500, "text/plain", str(e).encode()
+                await send_response(writer, status, ctype, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        self.batcher.close()
+        self.pool.shutdown(wait=False)
+        self.dnn_pool.shutdown(wait=False)
+
+# ---------------------------
+# HTTP/1.1 plumbing
+# ---------------------------
+def decode(body):
+    return cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+
+def encode(img, ext):
+    ok, buf = cv2.imencode(ext, img)
+    if not ok:
+        raise HTTPError(500, f"Unable to encode result as {ext}")
+    return buf.tobytes()
+
+async def read_request(reader):
+    """Return (method, path, headers, body), or None when the client closed the connection"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(None, 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length") from None
+    if length < 0:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > MAX_BODY:
+        raise HTTPError(413, f"Request body larger than {MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+async def send_response(writer, status, ctype, payload, keep_alive=True):
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {ctype}\r\nContent-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + payload)
+    await writer.drain()
+
+async def serve(host, port, workers, batch_window, max_batch, ready=None):
+    loop = asyncio.get_running_loop()
+    service = ColorizeService(workers, batch_window, max_batch)
+    # Load the model once, up front, so the first request does not pay for it
+    available = await loop.run_in_executor(service.dnn_pool, app.colorizer.warmup)
+    if not available:
+        print("ℹ Model not available: deep requests will use the pseudocolor fallback.")
+    server = await asyncio.start_server(service.serve_client, host, port)
+    print(f"Serving on http://{host}:{port} ({workers} CPU workers, DNN batches of up to "
+          f"{max_batch} within {batch_window * 1e3:.0f} ms)", flush=True)
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP service for image enhancement and colorization.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4, help="threads for decode/enhance/encode (default: 4)")
+    parser.add_argument("--batch-window", type=float, default=10,
+                        help="ms to wait for more deep requests before running a batch (default: 10)")
+    parser.add_argument("--max-batch", type=int, default=8, help="largest DNN batch (default: 8)")
+    parser.add_argument("--dnn-size", type=int, help="network input size in pixels (default: 224)")
+    parser.add_argument("--ab-upsample", choices=app.AB_UPSAMPLE_MODES,
+                        help="bilinear or lightness-guided chroma upsampling (default: bilinear)")
+    args = parser.parse_args(argv)
+    try:
+        app.set_deep_defaults(args.dnn_size, args.ab_upsample)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        asyncio.run(serve(args.host, args.port, max(args.workers, 1),
+                          max(args.batch_window, 0) / 1e3, max(args.max_batch, 1)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
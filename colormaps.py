@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+colormaps.py
+User-defined and continuous colormaps, applied at full bit depth.
+- A Colormap is an OpenCV colormap, a table of RGB entries (256 or 65536, or
+  any other length) or a few control points (position 0..1 -> RGB); it compiles
+  to a BGR lookup table for any number of grey levels by linear interpolation
+- Maps load from .npy files: shape (N, 3) is a table, (K, 4) are control points
+  (position, r, g, b). Colours are 0..255, or 0..1 for float arrays
+- apply_colormap colours 8-bit images with one table lookup and 16-bit images
+  with one gather from a 65536-entry table that already contains the grey level
+  window, so no 8-bit intermediate is made and no levels are merged
+- Compiled tables are cached; load_colormaps reads every .npy in a directory
+
+Example (a three-point map saved for the GUI and the batch tools):
+    np.save("colormaps/ice.npy", np.array([[0, 0, 0, 40], [0.5, 0, 160, 255], [1, 255, 255, 255]]))
+"""
+
+import functools
+import glob
+import os
+
+import cv2
+import numpy as np
+
+COMPILED_CACHE_SIZE = 32
+
+class Colormap:
+    def __init__(self, name, positions, colors):
+        """positions: increasing (K,) values from 0 to 1; colors: (K, 3) BGR, 0..255"""
+        positions = np.asarray(positions, dtype=np.float64)
+        colors = np.asarray(colors, dtype=np.float64)
+        if positions.ndim != 1 or len(positions) < 2 or colors.shape != (len(positions), 3):
+            raise ValueError(f"Colormap '{name}' needs at least two positions with one BGR colour each")
+        if np.any(np.diff(positions) < 0):
+            raise ValueError(f"Colormap '{name}': control point positions must be increasing")
+        self.name = name
+        self.positions = positions
+        self.colors = colors
+
+    def __repr__(self):
+        return f"Colormap({self.name!r}, {len(self.positions)} points)"
+
+    @classmethod
+    def from_opencv(cls, name, code):
+        ramp = np.arange(256, dtype=np.uint8).reshape(256, 1)
+        return cls(name, np.linspace(0, 1, 256), cv2.applyColorMap(ramp, code).reshape(256, 3))
+
+    @classmethod
+    def from_table(cls, name, rgb):
+        """Evenly spaced RGB entries, e.g. 256 or 65536 of them"""
+        rgb = _to_255(rgb)
+        if rgb.ndim != 2 or rgb.shape[1] != 3:
+            raise ValueError(f"Colormap '{name}': a table must have shape (N, 3), got {rgb.shape}")
+        return cls(name, np.linspace(0, 1, len(rgb)), rgb[:, ::-1])
+
+    @classmethod
+    def from_control_points(cls, name, points):
+        """Rows of (position 0..1, r, g, b)"""
+        points = np.asarray(points, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 4:
+            raise ValueError(f"Colormap '{name}': control points must have shape (K, 4), got {points.shape}")
+        return cls(name, points[:, 0], _to_255(points[:, 1:])[:, ::-1])
+
+    @classmethod
+    def load(cls, path, name=None):
+        """A table (N, 3) or control points (K, 4) from a .npy file, named after the file"""
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        data = np.load(path)
+        if data.ndim == 2 and data.shape[1] == 4:
+            return cls.from_control_points(name, data)
+        return cls.from_table(name, data)
+
+    def table(self, levels=256, low=0, high=None):
+        """(levels, 3) BGR uint8 table: grey levels low..high span the map,
+        levels outside take its end colours. Cached per arguments."""
+        high = levels - 1 if high is None else high
+        return _compiled(self, int(levels), int(low), int(max(high, low + 1)))
+
+    def opencv_table(self):
+        """256x1x3 table for cv2.applyColorMap"""
+        return self.table(256).reshape(256, 1, 3)
+
+def _to_255(colors):
+    colors = np.asarray(colors)
+    if np.issubdtype(colors.dtype, np.floating):
+        return np.clip(colors, 0, 1).astype(np.float64) * 255.0
+    return colors.astype(np.float64)
+
+@functools.lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def _compiled(cmap, levels, low, high):
+    t = np.clip((np.arange(levels, dtype=np.float64) - low) / (high - low), 0.0, 1.0)
+    table = np.empty((levels, 3), dtype=np.uint8)
+    for c in range(3):
+        table[:, c] = np.rint(np.interp(t, cmap.positions, cmap.colors[:, c]))
+    table.setflags(write=False)
+    return table
+
+@functools.lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def opencv_colormap(code):
+    """Colormap for an OpenCV colormap id (one shared instance per id)"""
+    return Colormap.from_opencv(f"opencv:{code}", code)
+
+@functools.lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def _table_colormap(data, dtype):
+    """Colormap for a BGR table's bytes (one shared instance per table, so its compiled tables are reused)"""
+    bgr = np.frombuffer(data, dtype=dtype).reshape(-1, 3)
+    return Colormap("table", np.linspace(0, 1, len(bgr)), bgr)
+
+def as_colormap(colormap):
+    """Colormap from a Colormap, an OpenCV colormap id or a 256x1x3 BGR table as
+    accepted by cv2.applyColorMap"""
+    if isinstance(colormap, Colormap):
+        return colormap
+    if isinstance(colormap, np.ndarray):
+        bgr = np.ascontiguousarray(colormap.reshape(-1, 3))
+        return _table_colormap(bgr.tobytes(), bgr.dtype.str)
+    return opencv_colormap(int(colormap))
+
+def apply_colormap(gray, colormap, window=None):
+    """Colour a single-channel 8 or 16-bit image. window=(low, high) grey levels
+    span the map (default: the full range of the type)"""
+    cmap = as_colormap(colormap)
+    if gray.dtype == np.uint8:
+        return cv2.applyColorMap(gray, cmap.table(256, *(window or (0, 255))).reshape(256, 1, 3))
+    if gray.dtype != np.uint16:
+        raise ValueError(f"Unsupported grayscale depth {gray.dtype} (8 or 16-bit expected)")
+    # One gather per pixel from a table that holds window and colours together
+    return cmap.table(65536, *(window or (0, 65535)))[gray]
+
+def load_colormaps(directory):
+    """{name: Colormap} for every .npy file in directory (missing directory: none).
+    Files that are not valid colormaps are reported and skipped."""
+    maps = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.npy"))):
+        try:
+            cmap = Colormap.load(path)
+        except (ValueError, OSError) as e:
+            print(f"⚠ Skipping colormap {path}: {e}")
+            continue
+        maps[cmap.name] = cmap
+    return maps
+
+def compiled_cache_info():
+    return _compiled.cache_info()._asdict()
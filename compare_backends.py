@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+compare_backends.py
+Latency and colour error of the colorization network per inference backend
+and precision, against the OpenCV fp32 Caffe model as the reference.
+- Colour error is CIE76 Delta E between the colorized images, in LAB units
+  (around 2.3 is a just noticeable difference)
+- Configurations whose backend or model files are missing are listed and skipped,
+  as are unsupported pairs (openvino/fp16, int8 on opencv or openvino)
+- --quantize writes the int8 ONNX model from the fp32 ONNX export (needs
+  onnxruntime); the export itself is not part of this repository, see README
+
+Examples:
+    python compare_backends.py
+    python compare_backends.py --images scans/ --threads 4 --repeats 5
+    python compare_backends.py --quantize
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from pseudo_color_app_enhanced import (DNN_BACKENDS, DNN_PRECISIONS, MODEL_FILE, ONNX_FILES, PROTO_FILE,
+                                       PTS_FILE, ColorizationModel, compose_colorized, prepare_lab_image)
+
+def synthetic_grays(count, width=640, height=480):
+    rng = np.random.default_rng(0)
+    return [cv2.resize(rng.integers(0, 256, (height // 16, width // 16), dtype=np.uint8), (width, height),
+                       interpolation=cv2.INTER_CUBIC) for _ in range(count)]
+
+def load_grays(pattern, limit):
+    paths = sorted(glob.glob(os.path.join(pattern, "*")) if os.path.isdir(pattern) else glob.glob(pattern))
+    grays = [g for g in (cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in paths[:limit]) if g is not None]
+    if not grays:
+        raise SystemExit(f"No readable images in {pattern}")
+    return grays
+
+def to_lab(bgr):
+    return cv2.cvtColor(bgr.astype(np.float32) / 255.0, cv2.COLOR_BGR2LAB)
+
+def colorize(model, prepared, repeats):
+    """Colorized images and the median forward time (seconds) per image"""
+    outs, times = [], []
+    for L, L_rs in prepared:
+        blob = cv2.dnn.blobFromImage(L_rs)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            ab = model.forward(blob)
+            times.append(time.perf_counter() - start)
+        outs.append(compose_colorized(L, ab[0].transpose((1, 2, 0))))
+    return outs, float(np.median(times))
+
+def quantize_int8(fp32_path, int8_path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"Wrote {int8_path}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare colorization backends and precisions.")
+    parser.add_argument("--images", help="directory or glob of test images (default: synthetic)")
+    parser.add_argument("--count", type=int, default=4, help="number of test images (default: 4)")
+    parser.add_argument("--backends", default=",".join(DNN_BACKENDS))
+    parser.add_argument("--precisions", default=",".join(DNN_PRECISIONS))
+    parser.add_argument("--threads", type=int, default=0, help="inference threads (default: library default)")
+    parser.add_argument("--repeats", type=int, default=3, help="timed forward passes per image (default: 3)")
+    parser.add_argument("--quantize", action="store_true", help="create the int8 ONNX model and exit")
+    args = parser.parse_args(argv)
+
+    if args.quantize:
+        if not os.path.exists(ONNX_FILES["fp32"]):
+            print(f"--quantize needs the fp32 ONNX export {ONNX_FILES['fp32']}, which is not shipped; "
+                  f"convert the Caffe model to ONNX first (see README)", file=sys.stderr)
+            return 1
+        try:
+            quantize_int8(ONNX_FILES["fp32"], ONNX_FILES["int8"])
+        except ImportError:
+            print("onnxruntime is required for --quantize", file=sys.stderr)
+            return 1
+        return 0
+
+    grays = load_grays(args.images, args.count) if args.images else synthetic_grays(args.count)
+    prepared = [prepare_lab_image(g) for g in grays]
+
+    reference = ColorizationModel(PROTO_FILE, MODEL_FILE, PTS_FILE, threads=args.threads)
+    if not reference.warmup():
+        print(f"Reference model unavailable: {reference.error or reference.unavailable_reason()}", file=sys.stderr)
+        return 1
+    ref_outs, ref_time = colorize(reference, prepared, args.repeats)
+    ref_labs = [to_lab(o) for o in ref_outs]
+    reference.unload()
+
+    print(f"{len(grays)} images, {args.repeats} timed passes each")
+    print(f"{'configuration':<22} {'ms/forward':>10} {'speedup':>8} {'mean dE':>8} {'p95 dE':>8} {'max dE':>8}")
+    print(f"{'opencv/fp32 (ref)':<22} {ref_time * 1e3:>10.1f} {1.0:>7.2f}x {0:>8.2f} {0:>8.2f} {0:>8.2f}")
+    for backend in args.backends.split(","):
+        for precision in args.precisions.split(","):
+            if (backend, precision) == ("opencv", "fp32"):
+                continue
+            try:
+                model = ColorizationModel(PROTO_FILE, MODEL_FILE, PTS_FILE, backend, precision, args.threads)
+            except ValueError as e:
+                print(f"{backend + '/' + precision:<22} skipped: {e}")
+                continue
+            reason = model.unavailable_reason()
+            if reason is not None or not model.warmup():
+                print(f"{model.describe():<22} skipped: {reason or model.error}")
+                continue
+            outs, seconds = colorize(model, prepared, args.repeats)
+            model.unload()
+            delta_e = np.concatenate([np.linalg.norm(to_lab(o) - ref, axis=2).ravel()
+                                      for o, ref in zip(outs, ref_labs)])
+            print(f"{model.describe():<22} {seconds * 1e3:>10.1f} {ref_time / seconds:>7.2f}x "
+                  f"{delta_e.mean():>8.2f} {np.percentile(delta_e, 95):>8.2f} {delta_e.max():>8.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
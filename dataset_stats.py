@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+dataset_stats.py
+First pass of consistent pseudocoloring over a whole dataset.
+- GrayHistogram counts grey levels (256 bins for 8-bit, 65536 for 16-bit data)
+  and merges with other histograms, so any number of images or frames is
+  summarised in constant memory and workers can count in parallel
+- The dataset window is taken at percentiles of the merged histogram; the
+  second pass maps every image through that one window and a colormap, so the
+  same grey level gets the same colour in every image (batch_colorize.py
+  --dataset-window / --window-stats)
+- Histograms are saved as .npz, so a reference window can be reused for later data
+
+Example:
+    python dataset_stats.py thermal/ -r -j 8 -o thermal_stats.npz
+    python batch_colorize.py thermal/ -r -o out/ -p pseudocolor:turbo --window-stats thermal_stats.npz
+"""
+
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from pseudo_color_app_enhanced import WINDOW_PERCENTILES, histogram_window
+
+READ_FLAGS = cv2.IMREAD_ANYDEPTH | cv2.IMREAD_GRAYSCALE
+
+class GrayHistogram:
+    def __init__(self, bins=None):
+        """bins is 256 or 65536; None takes it from the first image added"""
+        self.bins = bins
+        self.counts = None if bins is None else np.zeros(bins, np.int64)
+        self.images = 0
+
+    def add(self, gray):
+        if gray.dtype not in (np.uint8, np.uint16):
+            raise ValueError(f"Unsupported grayscale depth {gray.dtype} (8 or 16-bit expected)")
+        bins = 256 if gray.dtype == np.uint8 else 65536
+        self._check_bins(bins)
+        hist = cv2.calcHist([gray], [0], None, [bins], [0, bins]).ravel()
+        self.counts += np.rint(hist).astype(np.int64)
+        self.images += 1
+
+    def merge(self, other):
+        """Add another histogram's counts to this one; returns self"""
+        if other.counts is not None:
+            self._check_bins(other.bins)
+            self.counts += other.counts
+        self.images += other.images
+        return self
+
+    def _check_bins(self, bins):
+        if self.counts is None:
+            self.bins = bins
+            self.counts = np.zeros(bins, np.int64)
+        elif bins != self.bins:
+            raise ValueError("Images of different bit depths (8 and 16-bit) cannot share one window; "
+                             "process them separately")
+
+    @property
+    def pixels(self):
+        return 0 if self.counts is None else int(self.counts.sum())
+
+    def window(self, percentiles=WINDOW_PERCENTILES):
+        """(low, high) grey levels at the given percentiles over everything added"""
+        if not self.pixels:
+            raise ValueError("Empty histogram")
+        return histogram_window(self.counts, percentiles)
+
+    def save(self, path):
+        """Write the histogram to path (.npz is appended if missing); returns the file name"""
+        if not path.endswith(".npz"):
+            path += ".npz"
+        np.savez(path, counts=self.counts, images=self.images)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            hist = cls(len(data["counts"]))
+            hist.counts[:] = data["counts"]
+            hist.images = int(data["images"])
+        return hist
+
+def histogram_of(paths):
+    """Histogram of a list of files and the paths that could not be read"""
+    hist = GrayHistogram()
+    unreadable = []
+    for path in paths:
+        gray = cv2.imread(path, READ_FLAGS)
+        if gray is None:
+            unreadable.append(path)
+            continue
+        try:
+            hist.add(gray)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}") from None
+    return hist, unreadable
+
+def collect_histogram(paths, workers=1, chunk=64, on_error=None):
+    """Merged histogram of all paths. Workers count chunks of files in parallel and
+    at most two chunks per worker are in flight, so memory does not grow with the dataset.
+    Raises ValueError if the files mix 8 and 16-bit depths."""
+    total = GrayHistogram()
+
+    def merge(result):
+        hist, unreadable = result
+        total.merge(hist)
+        for path in unreadable:
+            if on_error is not None:
+                on_error(path)
+
+    chunks = (paths[i:i + chunk] for i in range(0, len(paths), chunk))
+    if workers <= 1:
+        for c in chunks:
+            merge(histogram_of(c))
+        return total
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for c in chunks:
+            pending.append(pool.submit(histogram_of, c))
+            if len(pending) >= 2 * workers:
+                merge(pending.popleft().result())
+        while pending:
+            merge(pending.popleft().result())
+    return total
+
+def parse_percentiles(value):
+    low, high = (float(v) for v in value.split(","))
+    if not 0 <= low < high <= 100:
+        raise ValueError(f"Percentiles must satisfy 0 <= low < high <= 100, got {value}")
+    return low, high
+
+def main(argv=None):
+    from batch_colorize import collect_jobs
+
+    parser = argparse.ArgumentParser(description="Grey level statistics over a dataset for a shared pseudocolor window.")
+    parser.add_argument("inputs", nargs="+", help="input directories or glob patterns")
+    parser.add_argument("-o", "--output", help="save the histogram (.npz) for batch_colorize.py --window-stats")
+    parser.add_argument("-r", "--recursive", action="store_true", help="descend into subdirectories")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: all cores)")
+    parser.add_argument("--percentiles", default=",".join(str(p) for p in WINDOW_PERCENTILES),
+                        help="low,high percentiles of the window (default: %(default)s)")
+    args = parser.parse_args(argv)
+    try:
+        percentiles = parse_percentiles(args.percentiles)
+    except ValueError as e:
+        parser.error(str(e))
+
+    paths = [src for src, _ in collect_jobs(args.inputs, "", args.recursive)]
+    if not paths:
+        print("No input images found.")
+        return 1
+    try:
+        hist = collect_histogram(paths, args.workers,
+                                 on_error=lambda p: print(f"[ERROR] {p}: Unable to read image", file=sys.stderr))
+    except ValueError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+    if not hist.images:
+        print("No readable images.")
+        return 1
+    low, high = hist.window(percentiles)
+    print(f"{hist.images} images, {hist.pixels / 1e6:.1f} MP, {hist.bins} levels: "
+          f"window {low}..{high} at percentiles {percentiles[0]}..{percentiles[1]}")
+    if args.output:
+        print(f"Histogram written to {hist.save(args.output)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
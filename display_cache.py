@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+display_cache.py
+Display-size copies of images for the GUI panels.
+- Images are shrunk with INTER_AREA on the BGR (or gray) data and only then
+  converted to RGB, so a refresh touches display-sized pixels, not the full image
+- The scaled copies of the most recent images are kept per display size, so
+  undo/redo and before/after toggling redraw without touching the full image
+- Each panel keeps its PhotoImage and pastes new pixels into it when the size
+  is unchanged; showing the same image at the same size again does nothing
+- Entries hold weak references: an image the history drops is not kept alive here
+"""
+
+import weakref
+from collections import OrderedDict
+
+import cv2
+from PIL import Image, ImageTk
+
+def fit_size(width, height, max_width, max_height):
+    """Size of a width x height image scaled to fit the box, never enlarged"""
+    scale = min(max_width / width, max_height / height, 1.0)
+    return max(int(width * scale), 1), max(int(height * scale), 1)
+
+def to_display_rgb(img, size):
+    """img (BGR or gray) resized to size (w, h) and converted to RGB"""
+    h, w = img.shape[:2]
+    if (w, h) != size:
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(img, cv2.COLOR_GRAY2RGB if img.ndim == 2 else cv2.COLOR_BGR2RGB)
+
+class DisplayCache:
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # (id(img), shape, size) -> (weakref to img, RGB array)
+        self._photos = {}               # panel -> PhotoImage
+        self._shown = {}                # panel -> (weakref to img, size)
+
+    def scaled(self, img, size):
+        """RGB copy of img at size, from the cache when possible"""
+        key = (id(img), img.shape, size)
+        entry = self._entries.get(key)
+        # The weak reference tells a live image from a new one that reuses a freed id
+        if entry is not None and entry[0]() is img:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        rgb = to_display_rgb(img, size)
+        self._entries[key] = (weakref.ref(img, lambda _, key=key: self._entries.pop(key, None)), rgb)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return rgb
+
+    def show(self, panel, img, max_width, max_height):
+        """Display img on a Tk label, scaled to fit max_width x max_height"""
+        size = fit_size(img.shape[1], img.shape[0], max_width, max_height)
+        shown = self._shown.get(panel)
+        if shown is not None and shown[0]() is img and shown[1] == size:
+            return
+        pil_img = Image.fromarray(self.scaled(img, size))
+        photo = self._photos.get(panel)
+        if photo is not None and (photo.width(), photo.height()) == size:
+            photo.paste(pil_img)
+        else:
+            photo = self._photos[panel] = ImageTk.PhotoImage(pil_img)
+        panel.config(image=photo, text="")
+        # Keep reference to prevent garbage collection
+        panel.image = photo
+        self._shown[panel] = (weakref.ref(img), size)
+
+    def shown(self, panel):
+        """The image currently displayed on panel, if it is still alive"""
+        entry = self._shown.get(panel)
+        return entry[0]() if entry is not None else None
+
+    def clear(self):
+        self._entries.clear()
+        self._shown.clear()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+history.py
+Undo/redo history with a memory budget instead of a fixed number of full copies.
+- Each state keeps its image by reference (the GUI never modifies results in place)
+- States remember the recipe that produced them: func(*args) on the loaded image
+- When the stored frames exceed the budget, states farthest from the current
+  one give up their frame: states with a recipe drop it and are re-derived on
+  demand, others are kept PNG-compressed
+- Only if that is still not enough are the oldest states dropped
+- undo/redo(rebuild=False) return None for a state that must be re-derived, so
+  the GUI can run the recipe in the background and hand the frame back with
+  store_frame
+"""
+
+import cv2
+import numpy as np
+
+class HistoryEntry:
+    __slots__ = ("frame", "packed", "recipe", "label")
+
+    def __init__(self, frame, recipe=None, label=""):
+        self.frame = frame
+        self.packed = None
+        self.recipe = recipe
+        self.label = label
+
+    @property
+    def nbytes(self):
+        if self.frame is not None:
+            return self.frame.nbytes
+        if self.packed is not None:
+            return len(self.packed)
+        return 0
+
+    def pack(self):
+        ok, buf = cv2.imencode(".png", self.frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if ok:
+            self.packed = buf.tobytes()
+            self.frame = None
+
+    def image(self):
+        if self.frame is not None:
+            return self.frame
+        if self.packed is not None:
+            return cv2.imdecode(np.frombuffer(self.packed, np.uint8), cv2.IMREAD_UNCHANGED)
+        func, args = self.recipe
+        return as_bgr(func(*args))
+
+    @property
+    def available(self):
+        """False if the frame was dropped and only the recipe is left"""
+        return self.frame is not None or self.packed is not None
+
+def as_bgr(img):
+    return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR) if img.ndim == 2 else img
+
+class HistoryStore:
+    def __init__(self, budget_images=3.0, budget_bytes=None, max_entries=100):
+        """budget_bytes defaults to budget_images color (BGR) results of the loaded
+        image's size, whether the loaded image itself is gray or color"""
+        self.budget_images = budget_images
+        self.budget_bytes = budget_bytes
+        self.max_entries = max_entries
+        self.entries = []
+        self.index = -1
+        self._budget = 0
+
+    def reset(self, base):
+        """Start a new history whose first state is the loaded image (not counted in the budget)"""
+        self.entries = [HistoryEntry(base, label="original")]
+        self.index = 0
+        h, w = base.shape[:2]
+        self._budget = self.budget_bytes or int(h * w * 3 * self.budget_images)
+
+    def push(self, img, recipe=None, label=""):
+        # Remove any future history if we're not at the end
+        del self.entries[self.index + 1:]
+        self.entries.append(HistoryEntry(img, recipe, label))
+        self.index = len(self.entries) - 1
+        self._enforce_budget()
+
+    @property
+    def can_undo(self):
+        return self.index > 0
+
+    @property
+    def can_redo(self):
+        return self.index < len(self.entries) - 1
+
+    def undo(self, rebuild=True):
+        """Step back and return the image. With rebuild=False a state whose frame was
+        dropped is not re-derived here: None is returned and the caller runs
+        current_entry().recipe and passes the result to store_frame."""
+        if not self.can_undo:
+            return None
+        self.index -= 1
+        return self._restore(rebuild)
+
+    def redo(self, rebuild=True):
+        if not self.can_redo:
+            return None
+        self.index += 1
+        return self._restore(rebuild)
+
+    def current(self):
+        return self.entries[self.index].image() if self.entries else None
+
+    def current_entry(self):
+        return self.entries[self.index] if self.entries else None
+
+    def store_frame(self, entry, img):
+        """Give a re-derived frame back to entry; True if entry is still the current state"""
+        if self.current_entry() is not entry:
+            return False
+        entry.frame, entry.packed = as_bgr(img), None
+        self._enforce_budget()
+        return True
+
+    def stored_bytes(self):
+        return sum(e.nbytes for e in self.entries[1:])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _restore(self, rebuild=True):
+        entry = self.entries[self.index]
+        if not rebuild and not entry.available:
+            return None
+        img = entry.image()
+        # The current state is kept uncompressed so it is not decoded twice
+        if entry.frame is None:
+            entry.frame, entry.packed = img, None
+            self._enforce_budget()
+        return img
+
+    def _enforce_budget(self):
+        while len(self.entries) > self.max_entries:
+            self._drop_oldest()
+        # Farthest from the current state gives up memory first
+        candidates = sorted(range(1, len(self.entries)), key=lambda i: -abs(i - self.index))
+        for i in candidates:
+            if self.stored_bytes() <= self._budget:
+                return
+            if i == self.index:
+                continue
+            entry = self.entries[i]
+            if entry.recipe is not None:
+                entry.frame = entry.packed = None
+            elif entry.frame is not None:
+                entry.pack()
+        while self.stored_bytes() > self._budget and self.index > 1:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        del self.entries[1]
+        self.index -= 1
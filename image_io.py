@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+image_io.py
+Overlapping image reads and writes with processing for batch runs.
+- PrefetchLoader decodes the next N files on a thread pool while the current
+  one is processed; optional reduced-resolution / grayscale decode flags.
+  Full-size reads keep grayscale files single-channel (16-bit ones windowed to 8 bits,
+  unless keep_depth is set for pipelines that only pseudocolor)
+- AsyncWriter encodes and writes results on a thread pool with configurable
+  PNG compression and JPEG quality, writing atomically (temporary file + rename)
+- Both count the time the processing side spent waiting on them and the depth
+  of their queues, so a run shows whether it is I/O or compute bound
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from pseudo_color_app_enhanced import normalize_depth
+
+REDUCED_FLAGS = {
+    (False, 2): cv2.IMREAD_REDUCED_COLOR_2, (False, 4): cv2.IMREAD_REDUCED_COLOR_4,
+    (False, 8): cv2.IMREAD_REDUCED_COLOR_8, (True, 2): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    (True, 4): cv2.IMREAD_REDUCED_GRAYSCALE_4, (True, 8): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+def read_flags(gray=False, reduce=1):
+    """imread flags for a full or 1/2, 1/4, 1/8 size decode, in color or grayscale.
+    The decoders (JPEG in particular) produce these directly, without a full-size color image.
+    Full-size reads keep the file's depth and, unless gray, its channel count; see read_image."""
+    if reduce == 1:
+        return cv2.IMREAD_ANYDEPTH | (cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_ANYCOLOR)
+    try:
+        return REDUCED_FLAGS[(gray, reduce)]
+    except KeyError:
+        raise ValueError(f"Unsupported reduction 1/{reduce} (choose 1, 2, 4 or 8)") from None
+
+def read_image(path, flags=cv2.IMREAD_ANYDEPTH | cv2.IMREAD_ANYCOLOR, window=None, keep_depth=False):
+    """cv2.imread brought to 8 bits (see normalize_depth); grayscale files stay
+    single-channel, which the pipelines accept directly. window=(low, high) maps
+    grey levels the same way for every image instead of per image.
+    keep_depth returns the image as decoded; the window is then applied by the
+    colormap (see pipeline.keeps_depth)."""
+    img = cv2.imread(path, flags)
+    if img is None or keep_depth:
+        return img
+    return normalize_depth(img, window)
+
+def write_params(path, png_compression=None, jpeg_quality=None):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".png" and png_compression is not None:
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+    if ext in (".jpg", ".jpeg") and jpeg_quality is not None:
+        return [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    return []
+
+def write_atomic(path, img, params=()):
+    """Write via a temporary file so a killed run never leaves a truncated output behind"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    base, ext = os.path.splitext(path)
+    tmp = f"{base}.tmp{os.getpid()}_{threading.get_ident()}{ext}"
+    if not cv2.imwrite(tmp, img, list(params)):
+        raise IOError(f"Unable to write {path}")
+    os.replace(tmp, path)
+
+class IOStats:
+    def __init__(self):
+        self.items = 0
+        self.busy = 0.0       # seconds the I/O threads spent reading/decoding or encoding/writing
+        self.wait = 0.0       # seconds the processing side was blocked on this stage
+        self.depth_sum = 0
+        self.depth_max = 0
+
+    def sample_depth(self, depth):
+        self.depth_sum += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    def describe(self, name, depth_label):
+        mean_depth = self.depth_sum / self.items if self.items else 0.0
+        return (f"{name}: {self.items} images, {self.busy:.1f}s I/O, {self.wait:.1f}s waited on, "
+                f"{depth_label} mean {mean_depth:.1f} / max {self.depth_max}")
+
+class PrefetchLoader:
+    """Iterate over (path, image) in order, with up to depth images decoded ahead.
+    image is None for files that cannot be read."""
+    def __init__(self, paths, depth=4, threads=2, flags=cv2.IMREAD_ANYDEPTH | cv2.IMREAD_ANYCOLOR, window=None,
+                 keep_depth=False):
+        self.paths = list(paths)
+        self.depth = max(depth, 1)
+        self.flags = flags
+        self.window = window
+        self.keep_depth = keep_depth
+        self.stats = IOStats()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(threads, 1), thread_name_prefix="read")
+
+    def _read(self, path):
+        start = time.perf_counter()
+        img = read_image(path, self.flags, self.window, self.keep_depth)
+        with self._lock:
+            self.stats.busy += time.perf_counter() - start
+        return img
+
+    def __iter__(self):
+        pending = deque()
+        paths = iter(self.paths)
+        try:
+            for path in paths:
+                pending.append((path, self._pool.submit(self._read, path)))
+                if len(pending) >= self.depth:
+                    break
+            while pending:
+                path, future = pending.popleft()
+                # Images already decoded and waiting: close to depth means compute bound
+                self.stats.sample_depth(sum(f.done() for _, f in pending) + future.done())
+                start = time.perf_counter()
+                img = future.result()
+                self.stats.wait += time.perf_counter() - start
+                self.stats.items += 1
+                nxt = next(paths, None)
+                if nxt is not None:
+                    pending.append((nxt, self._pool.submit(self._read, nxt)))
+                yield path, img
+        finally:
+            for _, future in pending:
+                future.cancel()
+            self._pool.shutdown(wait=False)
+
+class AsyncWriter:
+    """Write images in the background. write() blocks only when max_pending writes
+    are outstanding; finished() returns (tag, error) for completed writes."""
+    def __init__(self, threads=2, max_pending=8, png_compression=None, jpeg_quality=None):
+        self.max_pending = max(max_pending, 1)
+        self.png_compression = png_compression
+        self.jpeg_quality = jpeg_quality
+        self.stats = IOStats()
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._pool = ThreadPoolExecutor(max_workers=max(threads, 1), thread_name_prefix="write")
+
+    def _write(self, path, img):
+        start = time.perf_counter()
+        write_atomic(path, img, write_params(path, self.png_compression, self.jpeg_quality))
+        with self._lock:
+            self.stats.busy += time.perf_counter() - start
+
+    def write(self, path, img, tag=None):
+        """Queue img for writing; the caller must not modify img afterwards"""
+        self.stats.sample_depth(len(self._pending))
+        if len(self._pending) >= self.max_pending:
+            start = time.perf_counter()
+            self._pending[0][1].exception()
+            self.stats.wait += time.perf_counter() - start
+        self.stats.items += 1
+        self._pending.append((path if tag is None else tag, self._pool.submit(self._write, path, img)))
+
+    def finished(self, wait=False):
+        done = []
+        while self._pending and (wait or self._pending[0][1].done()):
+            tag, future = self._pending.popleft()
+            start = time.perf_counter()
+            error = future.exception()
+            self.stats.wait += time.perf_counter() - start
+            done.append((tag, None if error is None else str(error)))
+        return done
+
+    def close(self):
+        """Wait for all writes; returns (tag, error) for those not yet reported"""
+        done = self.finished(wait=True)
+        self._pool.shutdown()
+        return done
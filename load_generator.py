@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+load_generator.py
+Load test for colorize_server.py.
+- Keeps --concurrency connections busy sending the same image for --requests
+  requests (or --duration seconds) and reports p50/p90/p99 latency and throughput
+- With --spawn a server is started locally on a free port and stopped afterwards
+- Without an --image a synthetic grayscale test image is generated
+
+Example:
+    python load_generator.py --spawn -c 8 -n 200 --pipeline "clahe,deep"
+    python load_generator.py --port 8765 -c 16 --duration 30 --image scan.png
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+import cv2
+import numpy as np
+
+async def request(reader, writer, host, path, body):
+    """Send one POST over an open keep-alive connection; return (status, body)"""
+    writer.write((f"POST {path} HTTP/1.1\r\nHost: {host}\r\n"
+                  f"Content-Type: application/octet-stream\r\nContent-Length: {len(body)}\r\n\r\n").encode()
+                 + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+async def client(host, port, path, body, budget, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            if budget is not None:
+                if budget[0] <= 0:
+                    break
+                budget[0] -= 1
+            start = time.perf_counter()
+            try:
+                status, _ = await request(reader, writer, host, path, body)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                errors.append("connection")
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(status)
+    finally:
+        writer.close()
+
+async def run_load(host, port, path, body, concurrency, requests=None, duration=None):
+    latencies, errors = [], []
+    budget = [requests] if requests else None
+    deadline = time.perf_counter() + duration if duration else float("inf")
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, path, body, budget, deadline, latencies, errors)
+                           for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+def synthetic_image(width, height):
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, (max(height // 16, 2), max(width // 16, 2)), dtype=np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def spawn_server(port, extra_args):
+    server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "colorize_server.py")
+    proc = subprocess.Popen([sys.executable, server, "--port", str(port)] + extra_args,
+                            stdout=subprocess.PIPE, text=True)
+    # The server prints "Serving on ..." once the model is loaded and it accepts connections
+    for line in proc.stdout:
+        print(f"[server] {line.rstrip()}")
+        if line.startswith("Serving on"):
+            return proc
+    raise RuntimeError("Server exited before it started serving")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure latency and throughput of colorize_server.py.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--spawn", action="store_true", help="start a local server on a free port for the test")
+    parser.add_argument("--server-args", default="", help="extra arguments for the spawned server")
+    parser.add_argument("--pipeline", default="deep")
+    parser.add_argument("--format", default="png")
+    parser.add_argument("--image", help="image to send (default: synthetic 640x480 gray)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="parallel connections (default: 8)")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="total requests (default: 100)")
+    parser.add_argument("--duration", type=float, default=0, help="run for this many seconds instead of -n")
+    args = parser.parse_args(argv)
+
+    img = cv2.imread(args.image) if args.image else synthetic_image(640, 480)
+    if img is None:
+        parser.error(f"Unable to read {args.image}")
+    body = cv2.imencode(".png", img)[1].tobytes()
+    path = f"/process?pipeline={quote(args.pipeline)}&format={quote(args.format)}"
+
+    proc = None
+    if args.spawn:
+        args.port = free_port()
+        proc = spawn_server(args.port, args.server_args.split())
+    try:
+        latencies, errors, elapsed = asyncio.run(run_load(
+            args.host, args.port, path, body, max(args.concurrency, 1),
+            None if args.duration else args.requests, args.duration or None))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    print(f"{len(latencies)} ok, {len(errors)} failed in {elapsed:.1f}s with {args.concurrency} connections "
+          f"({img.shape[1]}x{img.shape[0]}, pipeline {args.pipeline})")
+    if errors:
+        print(f"  errors: {sorted(set(map(str, errors)))}")
+    if latencies:
+        ms = np.array(latencies) * 1e3
+        print(f"  latency p50 {np.percentile(ms, 50):.1f} ms  p90 {np.percentile(ms, 90):.1f} ms  "
+              f"p99 {np.percentile(ms, 99):.1f} ms  max {ms.max():.1f} ms")
+        print(f"  throughput {len(latencies) / elapsed:.2f} requests/s")
+    return 1 if errors or not latencies else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+pipeline.py
+Headless processing pipelines built from the functions in pseudo_color_app_enhanced.py.
+A pipeline spec is a comma separated list of operations, each with an optional
+parameter after a colon, applied in order:
+
+    clahe:3.0,gamma:1.2,sharpen,sat:1.4,deep
+    ace:2.5,pseudocolor:turbo
+
+Operations that work on grayscale (ace, pseudocolor, deep) convert their input
+to gray first; the others convert a gray input back to BGR. pseudocolor takes a
+colormap name (user maps from colormaps/ included) or the path of a .npy map.
+ace takes up to three values, strength:radius:mode, e.g. ace:2.5:45:box for a
+large window in the fast box mode (see ace_enhancement; pyramid mode is the
+fastest but approximate and cannot be split into bands or tiles).
+
+run_pipeline calls the functions one after another and is the reference.
+CompiledPipeline produces the same images from a fused plan that reuses
+preallocated buffers, which matters on very large scans.
+"""
+
+import cv2
+import numpy as np
+
+import pseudo_color_app_enhanced as app
+from colormaps import Colormap
+
+# name -> (function, input kind, default parameter)
+OPERATIONS = {
+    "ace": (app.ace_enhancement, "gray", 2.0),
+    "clahe": (app.clahe_enhancement, "bgr", 2.5),
+    "gamma": (app.gamma_correction, "bgr", 1.5),
+    "sharpen": (app.sharpen, "bgr", None),
+    "sat": (app.saturation_boost, "bgr", 1.4),
+    "pseudocolor": (app.pseudocolor, "gray", "Jet"),
+    "deep": (app.deep_colorize, "gray", None),
+}
+
+ALIASES = {
+    "saturation": "sat",
+    "colorize": "deep",
+}
+
+def parse_pipeline(spec):
+    """Turn a pipeline spec string into a list of (name, parameter) steps"""
+    steps = []
+    for token in spec.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        name, _, value = token.partition(":")
+        name = ALIASES.get(name.strip().lower(), name.strip().lower())
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}' (choose from {', '.join(OPERATIONS)})")
+        default = OPERATIONS[name][2]
+        value = value.strip()
+        if default is None:
+            if value:
+                raise ValueError(f"Operation '{name}' takes no parameter")
+            param = None
+        elif name == "pseudocolor":
+            param = _parse_colormap(value or default)
+        elif name == "ace":
+            param = _parse_ace(value)
+        else:
+            try:
+                param = float(value) if value else default
+            except ValueError:
+                raise ValueError(f"Invalid parameter for '{name}': {value}") from None
+        steps.append((name, param))
+    if not steps:
+        raise ValueError("Empty pipeline")
+    return steps
+
+def _parse_ace(value):
+    """(strength, radius, mode) from "strength[:radius[:mode]]" """
+    parts = [p.strip() for p in value.split(":")] if value else []
+    if len(parts) > 3:
+        raise ValueError(f"Invalid parameter for 'ace': {value} (expected strength:radius:mode)")
+    try:
+        strength = float(parts[0]) if parts and parts[0] else OPERATIONS["ace"][2]
+        radius = int(parts[1]) if len(parts) > 1 and parts[1] else app.ACE_RADIUS
+    except ValueError:
+        raise ValueError(f"Invalid parameter for 'ace': {value}") from None
+    mode = parts[2].lower() if len(parts) > 2 and parts[2] else "exact"
+    if radius < 1:
+        raise ValueError(f"ACE radius must be at least 1, got {radius}")
+    if mode not in app.ACE_MODES:
+        raise ValueError(f"Unknown ACE mode '{mode}' (choose from {', '.join(app.ACE_MODES)})")
+    return strength, radius, mode
+
+def _parse_colormap(name):
+    if name.lower().endswith(".npy"):
+        try:
+            return Colormap.load(name)
+        except (ValueError, OSError) as e:
+            raise ValueError(f"Invalid colormap file '{name}': {e}") from None
+    for key, colormap in app.COLORMAPS.items():
+        if key.lower() == name.lower():
+            return colormap
+    raise ValueError(f"Unknown colormap '{name}' (choose from {', '.join(app.COLORMAPS)})")
+
+def uses_dnn(steps):
+    return any(name == "deep" for name, _ in steps)
+
+def keeps_depth(steps):
+    """True for pipelines that only pseudocolor: 16-bit input can go straight to the
+    colormap (CompiledPipeline window=), without being cut to 8 bits first"""
+    return [name for name, _ in steps] == ["pseudocolor"]
+
+def call(func, img, param):
+    """func(img) with a step's parameter: none, a single value or a tuple of values (ace)"""
+    if param is None:
+        return func(img)
+    if isinstance(param, tuple):
+        return func(img, *param)
+    return func(img, param)
+
+def param_args(param):
+    """A step's parameter as a tuple of extra arguments, e.g. for tiling.halo_for"""
+    if param is None:
+        return ()
+    return param if isinstance(param, tuple) else (param,)
+
+def as_kind(img, kind):
+    if kind == "gray" and img.ndim == 3:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    if kind == "bgr" and img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    return img
+
+def run_pipeline(steps, img):
+    """Apply the steps one after another, exactly as the GUI buttons would"""
+    for name, param in steps:
+        func, kind, _ = OPERATIONS[name]
+        img = as_kind(img, kind)
+        img = call(func, img, param)
+    return img
+
+def run_pipeline_batch(steps, imgs, dnn_batch=None):
+    """Like run_pipeline for a list of images, but deep colorization runs as
+    batched forward passes of up to dnn_batch images"""
+    imgs = list(imgs)
+    for name, param in steps:
+        func, kind, _ = OPERATIONS[name]
+        imgs = [as_kind(img, kind) for img in imgs]
+        if name == "deep":
+            imgs = app.deep_colorize_batch(imgs, dnn_batch)
+        else:
+            imgs = [call(func, img, param) for img in imgs]
+    return imgs
+
+# ---------------------------
+# Fused execution plan
+# ---------------------------
+SHARPEN_KERNEL = np.array([[0,-1,0],[-1,5,-1],[0,-1,0]])
+
+def compile_plan(steps):
+    """Fuse a list of steps into stages:
+    - consecutive gamma steps become one BGR lookup table
+    - consecutive saturation steps become one S-channel table inside a single HSV round trip
+    - consecutive CLAHE steps share a single LAB round trip
+    Fused stages skip the 8-bit colour conversions between steps, so their
+    output can differ slightly from running the steps one by one.
+    Everything else maps to one stage per step."""
+    stages = []
+    for name, param in steps:
+        prev = stages[-1] if stages else None
+        if name == "gamma":
+            table = app.gamma_lut(param)
+            if prev and prev[0] == "lut":
+                stages[-1] = ("lut", table[prev[1]])
+            else:
+                stages.append(("lut", table))
+        elif name == "sat":
+            table = app.saturation_lut(param)
+            if prev and prev[0] == "hsv_sat":
+                stages[-1] = ("hsv_sat", table[prev[1]])
+            else:
+                stages.append(("hsv_sat", table))
+        elif name == "clahe":
+            if prev and prev[0] == "lab_clahe":
+                stages[-1] = ("lab_clahe", prev[1] + [param])
+            else:
+                stages.append(("lab_clahe", [param]))
+        else:
+            stages.append((name, param))
+    # Apply the fused S table through a 3-channel LUT that leaves H and V untouched
+    identity = np.arange(256, dtype=np.uint8)
+    return [(stage, np.dstack([identity, param, identity]) if stage == "hsv_sat" else param)
+            for stage, param in stages]
+
+STAGE_KIND = {
+    "lut": "bgr", "hsv_sat": "bgr", "lab_clahe": "bgr", "sharpen": "bgr",
+    "ace": "gray", "pseudocolor": "gray", "deep": "gray",
+}
+
+class CompiledPipeline:
+    """Runs a pipeline as a fused plan over buffers that are allocated once per
+    image shape and reused for every following image of that shape.
+    The array returned by run() belongs to the pipeline and is overwritten by
+    the next call; pass out= or copy it to keep it.
+    deep replaces deep_colorize for the deep stage (e.g. a temporal.TemporalColorizer).
+    window=(low, high) grey levels span the colormap of the pseudocolor stage; 16-bit
+    input without one is windowed per image (auto_window), as app.pseudocolor does."""
+    def __init__(self, steps, deep=None, window=None):
+        if isinstance(steps, str):
+            steps = parse_pipeline(steps)
+        self.steps = list(steps)
+        self.deep = deep or app.deep_colorize
+        self.window = window
+        self.stages = compile_plan(self.steps)
+        self._buffers = {}
+
+    def describe(self):
+        parts = []
+        for stage, param in self.stages:
+            if stage == "lab_clahe":
+                parts.append(f"lab[{'+'.join('clahe' for _ in param)}]")
+            else:
+                parts.append(stage)
+        return " -> ".join(parts)
+
+    def _buffer(self, name, shape, dtype=np.uint8):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self._buffers[name] = np.empty(shape, dtype)
+        return buf
+
+    def _bgr_target(self, src, shape):
+        # Ping-pong between two BGR buffers, never writing over the current source
+        a = self._buffer("bgr0", shape)
+        return self._buffer("bgr1", shape) if src is a else a
+
+    def _gray_target(self, src, shape):
+        a = self._buffer("gray0", shape)
+        return self._buffer("gray1", shape) if src is a else a
+
+    def _to_kind(self, img, kind):
+        h, w = img.shape[:2]
+        if kind == "gray" and img.ndim == 3:
+            return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self._gray_target(img, (h, w)))
+        if kind == "bgr" and img.ndim == 2:
+            return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR, dst=self._bgr_target(img, (h, w, 3)))
+        return img
+
+    def _run_stage(self, stage, param, img):
+        h, w = img.shape[:2]
+        if stage == "lut":
+            return cv2.LUT(img, param, dst=self._bgr_target(img, img.shape))
+        if stage == "hsv_sat":
+            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV, dst=self._buffer("cs", img.shape))
+            cv2.LUT(hsv, param, dst=hsv)
+            return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR, dst=self._bgr_target(img, img.shape))
+        if stage == "lab_clahe":
+            lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB, dst=self._buffer("cs", img.shape))
+            L = cv2.extractChannel(lab, 0, dst=self._buffer("l0", (h, w)))
+            L2 = self._buffer("l1", (h, w))
+            for clip_limit in param:
+                cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(8,8)).apply(L, dst=L2)
+                L, L2 = L2, L
+            cv2.insertChannel(L, lab, 0)
+            return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=self._bgr_target(img, img.shape))
+        if stage == "sharpen":
+            return cv2.filter2D(img, -1, SHARPEN_KERNEL, dst=self._bgr_target(img, img.shape))
+        if stage == "ace":
+            strength, radius, mode = param
+            if mode != "exact":
+                return app.ace_enhancement(img, strength, radius, mode)
+            # Same float32 arithmetic as ace_enhancement, written into reused buffers
+            g = self._buffer("f0", (h, w), np.float32)
+            np.divide(img, 255.0, out=g, dtype=np.float32)
+            mean = cv2.GaussianBlur(g, (2*radius + 1, 2*radius + 1), radius / 3,
+                                    dst=self._buffer("f1", (h, w), np.float32))
+            np.subtract(g, mean, out=g)
+            np.multiply(g, strength, out=g)
+            np.add(mean, g, out=g)
+            np.clip(g, 0, 1.0, out=g)
+            np.multiply(g, 255, out=g)
+            out = self._gray_target(img, (h, w))
+            np.copyto(out, g, casting="unsafe")
+            return out
+        if stage == "pseudocolor":
+            if img.dtype == np.uint16 or self.window is not None:
+                # Window and colours in one table lookup (colormaps.apply_colormap)
+                return app.pseudocolor(img, param, self.window)
+            table = param if isinstance(param, np.ndarray) else app.colormap_lut(param)
+            return cv2.applyColorMap(img, table, dst=self._bgr_target(img, (h, w, 3)))
+        if stage == "deep":
+            return self.deep(img)
+        raise ValueError(f"Unknown stage '{stage}'")
+
+    def run(self, img, out=None):
+        for stage, param in self.stages:
+            img = self._run_stage(stage, param, self._to_kind(img, STAGE_KIND[stage]))
+        if out is not None:
+            np.copyto(out, img)
+            return out
+        return img
+
+    def run_batch(self, imgs, dnn_batch=None):
+        """Run a list of images, batching deep colorization; returns new arrays"""
+        segments = [[]]
+        for stage in self.stages:
+            if stage[0] == "deep":
+                segments.append([])
+            else:
+                segments[-1].append(stage)
+        imgs = list(imgs)
+        for i, segment in enumerate(segments):
+            if i > 0:
+                imgs = app.deep_colorize_batch([as_kind(img, "gray") for img in imgs], dnn_batch)
+            if segment:
+                done = []
+                for img in imgs:
+                    for stage, param in segment:
+                        img = self._run_stage(stage, param, self._to_kind(img, STAGE_KIND[stage]))
+                    done.append(img.copy())
+                imgs = done
+        return imgs
@@ -7,34 +7,26 @@ Combined single-file application:
 - Pseudocolor mapping
 - Tkinter GUI to load image, apply enhancements, colorize, and save output
 This script handles missing model files gracefully (falls back to pseudocolor).
+The model is loaded on first use by the ColorizationModel shared with
+pseudo_color_app_enhanced.py (warmup(), load_time).
 """
 
-import os
+import threading
 import cv2
 import numpy as np
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk
 
+from pseudo_color_app_enhanced import ColorizationModel
+
 # Optional pretrained model files for Zhang2016-based colorizer (OpenCV): place these files in same folder
 PROTO_FILE = "colorization_deploy_v2.prototxt"
 MODEL_FILE = "colorization_release_v2.caffemodel"
 PTS_FILE = "pts_in_hull.npy"
 
-net = None
-if os.path.exists(PROTO_FILE) and os.path.exists(MODEL_FILE) and os.path.exists(PTS_FILE):
-    try:
-        pts = np.load(PTS_FILE)
-        net = cv2.dnn.readNetFromCaffe(PROTO_FILE, MODEL_FILE)
-        pts2 = pts.transpose().reshape(2, 313, 1, 1)
-        net.getLayer(net.getLayerId("class8_ab")).blobs = [pts2.astype(np.float32)]
-        net.getLayer(net.getLayerId("conv8_313_rh")).blobs = [np.full([1,313], 2.606, dtype="float32")]
-        print(" Pretrained colorization model loaded.")
-    except Exception as e:
-        print(" Failed to load colorizer model:", e)
-        net = None
-else:
-    print("ℹ Pretrained model files not found. Colorization will use pseudocolor fallback (Jet).")
+# Loaded on first deep_colorize call (or warmup()), not at import time
+colorizer = ColorizationModel(PROTO_FILE, MODEL_FILE, PTS_FILE)
 
 # ---------------------------
 # Utilities & model helper
@@ -85,13 +77,11 @@ def pseudocolor(gray):
     return cv2.applyColorMap(gray, cv2.COLORMAP_JET)
 
 def deep_colorize(gray_img):
-    global net
-    if net is None:
+    if colorizer.get() is None:
         # fallback: pseudocolor
         return pseudocolor(gray_img)
     L, L_rs = prepare_lab_image(gray_img)
-    net.setInput(cv2.dnn.blobFromImage(L_rs))
-    ab = net.forward()[0,:,:,:].transpose((1,2,0))
+    ab = colorizer.forward(cv2.dnn.blobFromImage(L_rs))[0,:,:,:].transpose((1,2,0))
     ab = cv2.resize(ab, (gray_img.shape[1], gray_img.shape[0]))
     # combine L + ab to LAB image (OpenCV expects L in 0-255, ab in 0-255 typically)
     lab_full = np.zeros((gray_img.shape[0], gray_img.shape[1], 3), dtype=np.uint8)
@@ -139,6 +129,9 @@ class App:
         self.img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         self.img_output = img.copy()
         self.show_image(self.img_output)
+        if not colorizer.loaded:
+            # Load the model in the background so the first Deep Colorize does not wait for it
+            threading.Thread(target=colorizer.warmup, daemon=True).start()
 
     def show_image(self, img):
         img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
@@ -17,39 +17,466 @@ import cv2
 import numpy as np
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from PIL import Image, ImageTk
 import threading
+import time
+import functools
+
+from ab_cache import ABCache
+from colormaps import Colormap, apply_colormap, load_colormaps
+from display_cache import DisplayCache
+from history import HistoryStore
+from render_worker import RenderWorker
+from viewport import ImagePyramid, ZoomWindow
+from tiling import run_cancellable
 
 # Optional pretrained model files
 PROTO_FILE = "colorization_deploy_v2.prototxt"
 MODEL_FILE = "colorization_release_v2.caffemodel"
 PTS_FILE = "pts_in_hull.npy"
+# The same network exported to ONNX (with the cluster centres baked in), per precision
+ONNX_FILES = {
+    "fp32": "colorization_v2.onnx",
+    "fp16": "colorization_v2_fp16.onnx",
+    "int8": "colorization_v2_int8.onnx",
+}
+
+# Inference backends and precisions; the defaults can be changed with the
+# COLORIZE_BACKEND, COLORIZE_PRECISION and COLORIZE_THREADS environment variables
+DNN_BACKENDS = ("opencv", "openvino", "onnxruntime")
+DNN_PRECISIONS = ("fp32", "fp16", "int8")
+
+# ---------------------------
+# Lazy model loading
+# ---------------------------
+def openvino_available():
+    return bool(cv2.dnn.getAvailableTargets(cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE))
 
-net = None
-if os.path.exists(PROTO_FILE) and os.path.exists(MODEL_FILE) and os.path.exists(PTS_FILE):
+def onnxruntime_available():
     try:
-        pts = np.load(PTS_FILE)
-        net = cv2.dnn.readNetFromCaffe(PROTO_FILE, MODEL_FILE)
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class OnnxRuntimeNet:
+    """onnxruntime session with the setInput/forward interface of a cv2.dnn net"""
+    def __init__(self, path, threads=0):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.input_dtype = np.float16 if inp.type == "tensor(float16)" else np.float32
+        self._blob = None
+
+    def setInput(self, blob):
+        self._blob = blob.astype(self.input_dtype, copy=False)
+
+    def forward(self):
+        return self.session.run(None, {self.input_name: self._blob})[0].astype(np.float32, copy=False)
+
+def unsupported_reason(backend, precision):
+    """Why a backend/precision pair can never run, or None"""
+    if backend == "openvino" and precision == "fp16":
+        return "OpenVINO on CPU picks its own reduced precision; use fp32"
+    if backend in ("opencv", "openvino") and precision == "int8":
+        # quantize_dynamic writes ConvInteger/MatMulInteger nodes, which OpenCV's ONNX importer rejects
+        return "OpenCV cannot load the dynamically quantized ONNX model; use onnxruntime/int8"
+    return None
+
+class ColorizationModel:
+    """Caffe colorizer that is loaded on first use instead of at import time.
+    Loading and inference are guarded by a lock, so one instance can be shared
+    between the GUI, its worker thread and batch tools.
+    backend/precision select how it runs: OpenCV (fp32 Caffe model, fp16 on CPUs
+    OpenCV supports it on), OpenVINO through OpenCV when built with it (fp32), or
+    onnxruntime with ONNX exports of the network (fp32, fp16, int8). The ONNX files
+    are not shipped; see unsupported_reason for the combinations that are refused."""
+    def __init__(self, proto_file, model_file, pts_file, backend="opencv", precision="fp32",
+                 threads=0, onnx_files=None):
+        self.proto_file = proto_file
+        self.model_file = model_file
+        self.pts_file = pts_file
+        self.onnx_files = dict(onnx_files or ONNX_FILES)
+        self.load_time = None
+        self.error = None
+        self.cache = None
+        self._net = None
+        self._loaded = False
+        self._lock = threading.RLock()
+        self.backend = self.precision = None
+        self.threads = 0
+        self.configure(backend, precision, threads)
+
+    def configure(self, backend=None, precision=None, threads=None):
+        """Change backend, precision or thread count; the model is reloaded on next use"""
+        backend = backend or self.backend
+        precision = precision or self.precision
+        if backend not in DNN_BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}' (choose from {', '.join(DNN_BACKENDS)})")
+        if precision not in DNN_PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}' (choose from {', '.join(DNN_PRECISIONS)})")
+        reason = unsupported_reason(backend, precision)
+        if reason is not None:
+            raise ValueError(f"{backend}/{precision} is not supported: {reason}")
+        self.unload()
+        self.backend, self.precision = backend, precision
+        self.threads = self.threads if threads is None else threads
+        if self.cache is not None:
+            # Entries are keyed on the model files and backend/precision tag
+            self.use_cache(self.cache.directory, self.cache.max_bytes)
+
+    def describe(self):
+        return f"{self.backend}/{self.precision}"
+
+    def uses_onnx(self):
+        return self.backend == "onnxruntime"
+
+    def model_files(self):
+        """Files the current configuration loads"""
+        if self.uses_onnx():
+            return (self.onnx_files[self.precision],)
+        return (self.proto_file, self.model_file, self.pts_file)
+
+    def files_present(self):
+        return all(os.path.exists(f) for f in self.model_files())
+
+    def unavailable_reason(self):
+        """Why the configuration cannot load, or None"""
+        if self.backend == "openvino" and not openvino_available():
+            return "OpenCV was built without OpenVINO"
+        if self.backend == "onnxruntime" and not onnxruntime_available():
+            return "onnxruntime is not installed"
+        missing = [f for f in self.model_files() if not os.path.exists(f)]
+        if missing and self.uses_onnx():
+            return f"missing {', '.join(missing)} (ONNX exports are not shipped, see README)"
+        if missing:
+            return f"missing {', '.join(missing)}"
+        return None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        """Return the network (loading it if needed), or None when unavailable"""
+        if self._loaded:
+            return self._net
+        with self._lock:
+            if not self._loaded:
+                self._net = self._load()
+                self._loaded = True
+        return self._net
+
+    def _load(self):
+        if not self.files_present():
+            print("ℹ Pretrained model files not found. Colorization will use pseudocolor fallback.")
+            return None
+        reason = self.unavailable_reason()
+        if reason is not None:
+            print(f"[ERROR] Colorizer backend {self.describe()} unavailable: {reason}")
+            self.error = reason
+            return None
+        start = time.perf_counter()
+        try:
+            if self.backend == "onnxruntime":
+                net = OnnxRuntimeNet(self.onnx_files[self.precision], self.threads)
+            else:
+                net = self._load_opencv()
+        except Exception as e:
+            print("[ERROR] Failed to load colorizer model:", e)
+            self.error = str(e)
+            return None
+        self.load_time = time.perf_counter() - start
+        suffix = "" if self.describe() == "opencv/fp32" else f" ({self.describe()})"
+        print(f"[OK] Pretrained colorization model loaded in {self.load_time:.2f}s.{suffix}")
+        return net
+
+    def _load_opencv(self):
+        pts = np.load(self.pts_file)
+        net = cv2.dnn.readNetFromCaffe(self.proto_file, self.model_file)
         pts2 = pts.transpose().reshape(2, 313, 1, 1)
         net.getLayer(net.getLayerId("class8_ab")).blobs = [pts2.astype(np.float32)]
         net.getLayer(net.getLayerId("conv8_313_rh")).blobs = [np.full([1,313], 2.606, dtype="float32")]
-        print("[OK] Pretrained colorization model loaded.")
-    except Exception as e:
-        print("[ERROR] Failed to load colorizer model:", e)
-        net = None
-else:
-    print("ℹ Pretrained model files not found. Colorization will use pseudocolor fallback.")
+        if self.backend == "openvino":
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE)
+        if self.precision == "fp16":
+            # OpenCV falls back to fp32 (with a warning) on CPUs without fp16 arithmetic
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU_FP16)
+        if self.threads:
+            # OpenCV backends share OpenCV's process-wide thread pool
+            cv2.setNumThreads(self.threads)
+        return net
+
+    def warmup(self):
+        """Load the model and run one dummy pass so the first real call is fast.
+        Returns True if the model is available."""
+        if self.get() is None:
+            return False
+        self.forward(np.zeros((1, 1, 224, 224), dtype=np.float32))
+        return True
+
+    def forward(self, blob):
+        net = self.get()
+        if net is None:
+            return None
+        with self._lock:
+            net.setInput(blob)
+            return net.forward()
+
+    def use_cache(self, directory, max_bytes=1 << 30):
+        """Keep network outputs in an on-disk ABCache keyed on input and model files"""
+        self.cache = ABCache(directory, max_bytes, self.model_files(), tag=self.describe())
+        return self.cache
+
+    def unload(self):
+        with self._lock:
+            self._net = None
+            self._loaded = False
+            self.load_time = None
+            self.error = None
+
+colorizer = ColorizationModel(PROTO_FILE, MODEL_FILE, PTS_FILE,
+                              backend=os.environ.get("COLORIZE_BACKEND", "opencv"),
+                              precision=os.environ.get("COLORIZE_PRECISION", "fp32"),
+                              threads=int(os.environ.get("COLORIZE_THREADS", "0")))
+
+# Undo/redo memory budget, as a multiple of the loaded image's size
+HISTORY_BUDGET_IMAGES = 3.0
+# ace_enhancement window: 2*radius+1 pixels, and its speed/accuracy modes
+ACE_RADIUS = 15
+ACE_MODES = ("exact", "box", "pyramid")
+
+# Deep colorization: network input size (square, in pixels) and how the network's
+# low-resolution ab output is brought up to the image size (see compose_colorized)
+INFERENCE_SIZE = int(os.environ.get("COLORIZE_SIZE", "224"))
+AB_UPSAMPLE = os.environ.get("COLORIZE_UPSAMPLE", "bilinear")
+AB_UPSAMPLE_MODES = ("bilinear", "guided")
+# Guided upsampling: coefficients are fitted at this many times the ab resolution,
+# and eps (guide in 0..1 units) sets how strong a lightness edge must be to stop chroma
+GUIDED_FACTOR = 4
+GUIDED_EPS = 1e-3
+# GUI quality presets: name -> (inference size, ab upsampling)
+DEEP_QUALITY = {
+    "Fast": (128, "bilinear"),
+    "Standard": (224, "bilinear"),
+    "High": (320, "guided"),
+}
+
+# Slider events closer together than this are coalesced into one preview
+PREVIEW_DEBOUNCE_MS = 40
+# Panels are redrawn this long after the window stops being resized
+RESIZE_DEBOUNCE_MS = 100
+
+# Colormap options shared by the GUI and the headless tools
+COLORMAPS = {
+    "Jet": cv2.COLORMAP_JET,
+    "Viridis": cv2.COLORMAP_VIRIDIS,
+    "Plasma": cv2.COLORMAP_PLASMA,
+    "Hot": cv2.COLORMAP_HOT,
+    "Cool": cv2.COLORMAP_COOL,
+    "Rainbow": cv2.COLORMAP_RAINBOW,
+    "Turbo": cv2.COLORMAP_TURBO
+}
+# User maps (.npy tables or control points, see colormaps.py) are added by file name
+COLORMAP_DIR = os.environ.get("COLORMAP_DIR", "colormaps")
+COLORMAPS.update(load_colormaps(COLORMAP_DIR))
+
+# ---------------------------
+# Lookup table cache
+# ---------------------------
+# Tables are keyed by parameters rounded to LUT_DECIMALS places, so slider
+# scrubbing and batch jobs with fixed settings reuse them instead of rebuilding.
+LUT_CACHE_SIZE = 256
+LUT_DECIMALS = 3
+
+def _readonly(table):
+    table.setflags(write=False)
+    return table
+
+@functools.lru_cache(maxsize=LUT_CACHE_SIZE)
+def _gamma_lut(gamma):
+    inv = 1.0 / gamma
+    return _readonly(((np.arange(256) / 255.0) ** inv * 255).astype(np.uint8))
+
+@functools.lru_cache(maxsize=LUT_CACHE_SIZE)
+def _saturation_lut(factor):
+    return _readonly(np.clip(np.arange(256, dtype=np.float32) * factor, 0, 255).astype(np.uint8))
+
+@functools.lru_cache(maxsize=LUT_CACHE_SIZE)
+def _saturation_hsv_lut(factor):
+    identity = np.arange(256, dtype=np.uint8)
+    return _readonly(np.dstack([identity, _saturation_lut(factor), identity]))
+
+@functools.lru_cache(maxsize=LUT_CACHE_SIZE)
+def _colormap_lut(colormap):
+    ramp = np.arange(256, dtype=np.uint8).reshape(256, 1)
+    return _readonly(cv2.applyColorMap(ramp, colormap))
+
+def gamma_lut(gamma):
+    return _gamma_lut(round(float(gamma), LUT_DECIMALS))
+
+def saturation_lut(factor):
+    """S-channel table equivalent to the float32 scale-and-clip in saturation_boost"""
+    return _saturation_lut(round(float(factor), LUT_DECIMALS))
+
+def saturation_hsv_lut(factor):
+    """1x256x3 table that applies saturation_lut to the S channel of an HSV image"""
+    return _saturation_hsv_lut(round(float(factor), LUT_DECIMALS))
+
+def colormap_lut(colormap):
+    """256x1x3 BGR table for an OpenCV colormap id or a Colormap"""
+    if isinstance(colormap, Colormap):
+        return colormap.opencv_table()
+    return _colormap_lut(int(colormap))
+
+def lut_cache_info():
+    """Hit/miss counters of the lookup table caches"""
+    return {name: cache.cache_info()._asdict() for name, cache in
+            (("gamma", _gamma_lut), ("saturation", _saturation_lut),
+             ("saturation_hsv", _saturation_hsv_lut), ("colormap", _colormap_lut), ("window", _window_lut))}
+
+def clear_lut_cache():
+    for cache in (_gamma_lut, _saturation_lut, _saturation_hsv_lut, _colormap_lut, _window_lut):
+        cache.cache_clear()
+
+# ---------------------------
+# Grayscale-native loading
+# ---------------------------
+# Grey levels clipped at each end when a 16-bit image is windowed automatically
+WINDOW_PERCENTILES = (0.5, 99.5)
+
+@functools.lru_cache(maxsize=1)
+def _lightness_lut():
+    ramp = np.arange(256, dtype=np.uint8).reshape(1, 256)
+    lab = cv2.cvtColor(cv2.cvtColor(ramp, cv2.COLOR_GRAY2BGR), cv2.COLOR_BGR2LAB)
+    return _readonly(lab[0, :, 0].copy())
+
+@functools.lru_cache(maxsize=16)
+def _window_lut(low, high):
+    levels = np.arange(65536, dtype=np.float32)
+    return _readonly(np.clip((levels - low) * (255.0 / (high - low)) + 0.5, 0, 255).astype(np.uint8))
+
+def gray_to_lightness(gray):
+    """8-bit LAB lightness of a gray image, identical to gray -> BGR -> LAB but in one table lookup"""
+    return cv2.LUT(gray, _lightness_lut())
+
+def histogram_window(hist, percentiles=WINDOW_PERCENTILES):
+    """(low, high) grey levels at the given percentiles of a histogram (one bin per level)"""
+    cdf = np.cumsum(hist)
+    low, high = np.searchsorted(cdf, [cdf[-1] * percentiles[0] / 100, cdf[-1] * percentiles[1] / 100])
+    return int(low), int(max(high, low + 1))
+
+def auto_window(gray16, percentiles=WINDOW_PERCENTILES):
+    """(low, high) grey levels of a 16-bit image at the given percentiles"""
+    return histogram_window(cv2.calcHist([gray16], [0], None, [65536], [0, 65536]).ravel(), percentiles)
+
+def window_to_8bit(gray, low=None, high=None):
+    """Map a 16-bit single-channel image to 8 bits, levels low..high spread over 0..255.
+    Without a window, auto_window picks one. 8-bit images are returned unchanged
+    unless a window is given, e.g. one shared by a whole dataset (see dataset_stats.py)."""
+    if gray.dtype == np.uint8:
+        if low is None or high is None:
+            return gray
+        return cv2.LUT(gray, _window_lut(int(low), int(max(high, low + 1)))[:256])
+    if gray.dtype != np.uint16:
+        raise ValueError(f"Unsupported grayscale depth {gray.dtype} (8 or 16-bit expected)")
+    if low is None or high is None:
+        auto_low, auto_high = auto_window(gray)
+        low = auto_low if low is None else low
+        high = auto_high if high is None else high
+    return _window_lut(int(low), int(max(high, low + 1)))[gray]
+
+def normalize_depth(img, window=None):
+    """Bring a decoded image to the 8 bits the enhancement functions expect:
+    grayscale is windowed (with window=(low, high) if given, else per image),
+    16-bit color is scaled as cv2.IMREAD_COLOR would"""
+    if img.ndim == 2 and window is not None:
+        return window_to_8bit(img, *window)
+    if img.dtype == np.uint8:
+        return img
+    if img.ndim == 2:
+        return window_to_8bit(img)
+    return (img >> 8).astype(np.uint8)
+
+def split_native(img):
+    """(bgr, gray) 8-bit images of an image read with IMREAD_ANYDEPTH | IMREAD_ANYCOLOR;
+    bgr is None for grayscale sources"""
+    img = normalize_depth(img)
+    if img.ndim == 2:
+        return None, img
+    return img, cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+def load_image_native(path):
+    """Read an image without expanding grayscale sources to three channels.
+    Returns (bgr, gray) as 8-bit images; bgr is None for grayscale sources
+    (operations that need color can cvtColor the gray image when they run).
+    Returns (None, None) if the file cannot be read."""
+    img = cv2.imread(path, cv2.IMREAD_ANYDEPTH | cv2.IMREAD_ANYCOLOR)
+    if img is None:
+        return None, None
+    return split_native(img)
 
 # ---------------------------
 # Enhancement Functions
 # ---------------------------
-def ace_enhancement(gray, strength=2.0):
-    g = gray.astype(np.float32) / 255.0
-    local_mean = cv2.GaussianBlur(g, (31,31), 5)
-    diff = g - local_mean
-    enhanced = local_mean + strength * diff
-    enhanced = np.clip(enhanced, 0, 1.0)
-    return (enhanced * 255).astype(np.uint8)
+def _box_sizes(sigma, passes=3):
+    """Widths of successive box filters whose combined variance matches a Gaussian of sigma"""
+    ideal = np.sqrt(12 * sigma * sigma / passes + 1)
+    lower = int(ideal) - (1 - int(ideal) % 2)
+    m = round((12 * sigma * sigma - passes * lower * lower - 4 * passes * lower - 3 * passes) / (-4 * lower - 4))
+    return [lower if i < m else lower + 2 for i in range(passes)]
+
+def _local_mean16(g16, sigma, mode):
+    """Approximate Gaussian local mean of a 16-bit image at a cost independent of sigma"""
+    if mode == "box":
+        # Three running-sum box passes (boxFilter cost does not depend on the width)
+        mean = g16
+        for width in _box_sizes(sigma):
+            mean = cv2.boxFilter(mean, -1, (width, width), borderType=cv2.BORDER_REFLECT_101)
+        return mean
+    # pyramid: average down by a power of two, blur the small image, upsample linearly.
+    # The area average and the linear upsampling blur too, so the small blur only adds the rest.
+    h, w = g16.shape
+    f = 1
+    # Largest factor that still leaves a blur of 1.5+ pixels on a 16+ pixel small image
+    while 2*f * 1.6 <= sigma and min(h, w) >= 2*f * 16:
+        f *= 2
+    if f == 1:
+        return cv2.GaussianBlur(g16, (0, 0), sigma, borderType=cv2.BORDER_REFLECT_101)
+    # Pad to a multiple of f so every small pixel covers exactly f x f full-size pixels
+    H, W = -(-h // f) * f, -(-w // f) * f
+    if (H, W) != (h, w):
+        g16 = cv2.copyMakeBorder(g16, 0, H - h, 0, W - w, cv2.BORDER_REFLECT_101)
+    small = cv2.resize(g16, (W // f, H // f), interpolation=cv2.INTER_AREA)
+    rest = np.sqrt(sigma * sigma - (f*f - 1) / 12 - f*f / 6) / f
+    small = cv2.GaussianBlur(small, (0, 0), rest, borderType=cv2.BORDER_REFLECT_101)
+    return cv2.resize(small, (W, H), interpolation=cv2.INTER_LINEAR)[:h, :w]
+
+def ace_enhancement(gray, strength=2.0, radius=ACE_RADIUS, mode="exact"):
+    """Adaptive contrast: push each pixel away from its Gaussian local mean
+    (window 2*radius+1, sigma radius/3).
+    mode "exact" is the float32 reference; "box" (three box filters, within about 1 level)
+    and "pyramid" (blur on a downsampled copy, fastest) work on uint16 and cost the same
+    for any radius, which makes large windows on big scans practical."""
+    if mode not in ACE_MODES:
+        raise ValueError(f"Unknown ACE mode '{mode}' (choose from {', '.join(ACE_MODES)})")
+    if radius < 1:
+        raise ValueError(f"ACE radius must be at least 1, got {radius}")
+    if mode == "exact":
+        g = gray.astype(np.float32) / 255.0
+        local_mean = cv2.GaussianBlur(g, (2*radius + 1, 2*radius + 1), radius / 3)
+        diff = g - local_mean
+        enhanced = local_mean + strength * diff
+        enhanced = np.clip(enhanced, 0, 1.0)
+        return (enhanced * 255).astype(np.uint8)
+    g16 = cv2.multiply(gray, 257, dtype=cv2.CV_16U)
+    mean16 = _local_mean16(g16, radius / 3, mode)
+    # mean + strength*(g - mean); the uint16 result saturates, which is the clip to [0, 1]
+    enhanced = cv2.addWeighted(g16, strength, mean16, 1 - strength, 0, dtype=cv2.CV_16U)
+    return cv2.multiply(enhanced, 1 / 257, dtype=cv2.CV_8U)
 
 def clahe_enhancement(img_bgr, clip_limit=2.5):
     lab = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2LAB)
@@ -60,45 +487,146 @@ def clahe_enhancement(img_bgr, clip_limit=2.5):
     return cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
 
 def gamma_correction(img, gamma=1.5):
-    inv = 1.0 / gamma
-    table = np.array([((i/255.0) ** inv) * 255 for i in range(256)]).astype("uint8")
-    return cv2.LUT(img, table)
+    return cv2.LUT(img, gamma_lut(gamma))
 
 def sharpen(img):
     kernel = np.array([[0,-1,0],[-1,5,-1],[0,-1,0]])
     return cv2.filter2D(img, -1, kernel)
 
-def saturation_boost(img, factor=1.3):
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-    h,s,v = cv2.split(hsv)
-    s = np.clip(s.astype(np.float32) * factor, 0, 255).astype(np.uint8)
-    boosted = cv2.merge([h,s,v])
-    return cv2.cvtColor(boosted, cv2.COLOR_HSV2BGR)
+def saturation_boost(img, factor=1.3, out=None):
+    """Scale HSV saturation by factor. Conversion, scaling (one 3-channel LUT) and
+    conversion back all run in a single buffer; pass out= (may be img) to reuse one."""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV, dst=out)
+    cv2.LUT(hsv, saturation_hsv_lut(factor), dst=hsv)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR, dst=hsv)
 
-def pseudocolor(gray, colormap=cv2.COLORMAP_JET):
-    return cv2.applyColorMap(gray, colormap)
+def pseudocolor(gray, colormap=cv2.COLORMAP_JET, window=None):
+    """Apply a colormap (OpenCV id, Colormap or 256x1x3 table). window=(low, high)
+    grey levels span the map; 16-bit input (default window: auto_window) is looked
+    up in a 65536-entry table, so no levels are merged into 8 bits first"""
+    if gray.dtype == np.uint8 and window is None:
+        if isinstance(colormap, np.ndarray):
+            return cv2.applyColorMap(gray, colormap)
+        return cv2.applyColorMap(gray, colormap_lut(colormap))
+    if gray.dtype == np.uint16 and window is None:
+        window = auto_window(gray)
+    return apply_colormap(gray, colormap, window)
 
-def prepare_lab_image(gray_img):
-    img_lab = cv2.cvtColor(cv2.cvtColor(gray_img, cv2.COLOR_GRAY2BGR), cv2.COLOR_BGR2LAB)
-    L = img_lab[:,:,0]
-    L_rs = cv2.resize(L, (224,224)).astype("float32") - 50
+def set_deep_defaults(size=None, upsample=None):
+    """Change the inference size and ab upsampling used when deep_colorize and
+    friends are called without them (e.g. once per batch worker)"""
+    global INFERENCE_SIZE, AB_UPSAMPLE
+    if size is not None:
+        if int(size) < 32:
+            raise ValueError(f"Inference size must be at least 32 pixels, got {size}")
+        INFERENCE_SIZE = int(size)
+    if upsample is not None:
+        if upsample not in AB_UPSAMPLE_MODES:
+            raise ValueError(f"Unknown ab upsampling '{upsample}' (choose from {', '.join(AB_UPSAMPLE_MODES)})")
+        AB_UPSAMPLE = upsample
+
+def prepare_lab_image(gray_img, size=None):
+    """Full-resolution 8-bit lightness and the network input: lightness resized to
+    size x size (default INFERENCE_SIZE). The Caffe model is fully convolutional and
+    accepts any size; its ab output is a quarter of it. Exported ONNX models may not."""
+    size = size or INFERENCE_SIZE
+    L = gray_to_lightness(gray_img)
+    L_rs = cv2.resize(L, (size, size)).astype("float32") - 50
     return L, L_rs
 
-def deep_colorize(gray_img):
-    global net
-    if net is None:
-        return pseudocolor(gray_img)
-    L, L_rs = prepare_lab_image(gray_img)
-    net.setInput(cv2.dnn.blobFromImage(L_rs))
-    ab = net.forward()[0,:,:,:].transpose((1,2,0))
-    ab = cv2.resize(ab, (gray_img.shape[1], gray_img.shape[0]))
-    lab_full = np.zeros((gray_img.shape[0], gray_img.shape[1], 3), dtype=np.uint8)
+def guided_upsample_ab(L, ab, factor=GUIDED_FACTOR, eps=GUIDED_EPS):
+    """Edge-aware upsampling of a low-resolution ab map to the size of L: a guided
+    filter (He et al.) with the lightness as the guide, so colour stops at the
+    edges of L instead of bleeding across them. The per-pixel linear model
+    ab = a*L + b is fitted with box filters at factor times the ab resolution and
+    applied at full resolution (the "fast guided filter")."""
+    h, w = L.shape
+    ah, aw = ab.shape[:2]
+    scale = min(1.0, factor * max(ah, aw) / max(h, w))
+    size = (max(round(w * scale), 1), max(round(h * scale), 1))
+    guide = L.astype(np.float32)
+    guide *= 1 / 255.0
+    I = cv2.resize(guide, size, interpolation=cv2.INTER_AREA)
+    p = cv2.resize(ab.astype(np.float32), size, interpolation=cv2.INTER_LINEAR)
+    # Window of about one ab cell on each side
+    r = max(1, round(size[0] / aw))
+    def box(x):
+        return cv2.boxFilter(x, -1, (2 * r + 1, 2 * r + 1), borderType=cv2.BORDER_REFLECT)
+    mean_I = box(I)
+    var_I = box(I * I) - mean_I * mean_I
+    mean_p = box(p)
+    cov_Ip = box(p * I[:, :, np.newaxis]) - mean_p * mean_I[:, :, np.newaxis]
+    a = cov_Ip / (var_I + eps)[:, :, np.newaxis]
+    b = mean_p - a * mean_I[:, :, np.newaxis]
+    a = cv2.resize(box(a), (w, h), interpolation=cv2.INTER_LINEAR)
+    b = cv2.resize(box(b), (w, h), interpolation=cv2.INTER_LINEAR)
+    a *= guide[:, :, np.newaxis]
+    a += b
+    return a
+
+def compose_colorized(L, ab, upsample=None):
+    """Upsample a network ab output (H'xW'x2) to the size of L and merge into a BGR image.
+    upsample is "bilinear" or "guided" (see guided_upsample_ab); default AB_UPSAMPLE."""
+    upsample = upsample or AB_UPSAMPLE
+    if upsample == "guided":
+        ab = guided_upsample_ab(L, ab)
+    elif upsample == "bilinear":
+        ab = cv2.resize(ab, (L.shape[1], L.shape[0]))
+    else:
+        raise ValueError(f"Unknown ab upsampling '{upsample}' (choose from {', '.join(AB_UPSAMPLE_MODES)})")
+    lab_full = np.zeros((L.shape[0], L.shape[1], 3), dtype=np.uint8)
     lab_full[:,:,0] = L
     ab_255 = np.clip(ab + 128.0, 0, 255).astype(np.uint8)
     lab_full[:,:,1:] = ab_255
     colorized = cv2.cvtColor(lab_full, cv2.COLOR_LAB2BGR)
     return colorized
 
+def predict_ab(L_rs):
+    """Run the network on an L_rs from prepare_lab_image; returns its low-resolution ab (H'xW'x2).
+    With colorizer.cache set, known inputs are answered from the cache without a forward pass."""
+    cache = colorizer.cache
+    key = cache.key(L_rs) if cache is not None else None
+    if key is not None:
+        ab = cache.get(key)
+        if ab is not None:
+            return ab
+    ab = colorizer.forward(cv2.dnn.blobFromImage(L_rs))[0,:,:,:].transpose((1,2,0))
+    if key is not None:
+        cache.put(key, ab)
+    return ab
+
+def deep_colorize(gray_img, size=None, upsample=None):
+    """Colorize with the network at size x size (default INFERENCE_SIZE), upsampling
+    its chroma with upsample (default AB_UPSAMPLE)"""
+    if colorizer.get() is None:
+        return pseudocolor(gray_img)
+    L, L_rs = prepare_lab_image(gray_img, size)
+    return compose_colorized(L, predict_ab(L_rs), upsample)
+
+def deep_colorize_batch(gray_images, batch_size=None, size=None, upsample=None):
+    """Colorize a list of grayscale images (any sizes) with one forward pass per
+    batch_size images (default: all at once). Returns a list of BGR images."""
+    if colorizer.get() is None:
+        return [pseudocolor(g) for g in gray_images]
+    batch_size = batch_size or max(len(gray_images), 1)
+    cache = colorizer.cache
+    results = []
+    for start in range(0, len(gray_images), batch_size):
+        prepared = [prepare_lab_image(g, size) for g in gray_images[start:start + batch_size]]
+        keys = [cache.key(L_rs) if cache is not None else None for _, L_rs in prepared]
+        abs_ = [cache.get(k) if k is not None else None for k in keys]
+        # Only cache misses go through the network
+        missing = [i for i, ab in enumerate(abs_) if ab is None]
+        if missing:
+            blob = np.stack([prepared[i][1] for i in missing])[:, np.newaxis, :, :]
+            for i, ab in zip(missing, colorizer.forward(blob)):
+                abs_[i] = ab.transpose((1,2,0))
+                if keys[i] is not None:
+                    cache.put(keys[i], abs_[i])
+        for (L, _), ab in zip(prepared, abs_):
+            results.append(compose_colorized(L, ab, upsample))
+    return results
+
 # ---------------------------
 # Enhanced GUI App
 # ---------------------------
@@ -114,25 +642,34 @@ class EnhancedApp:
         root.after_idle(lambda: root.attributes('-topmost', False))
         
         # State variables
-        self.img_bgr = None
+        self._img_bgr = None
         self.img_gray = None
+        self.img_gray16 = None
         self.img_output = None
         self.img_original = None
-        self.history = []
-        self.history_index = -1
+        self.history = HistoryStore(budget_images=HISTORY_BUDGET_IMAGES)
+        self._apply_recipe = None
         self.current_file_path = None
         self.processing = False
+        # Display-sized copies used for live slider previews
+        self.preview_bgr = None
+        self.preview_gray = None
+        self.preview_scale = 1.0
+        self._preview_after_id = None
+        self._resize_after_id = None
+        self._apply_message = ""
+        # Display-sized RGB copies of the shown images, reused by undo/redo and comparison
+        self.display = DisplayCache()
+        # Zoom/pan window (View menu) and the pyramids of the source it previews on
+        self.zoom_window = None
+        self._source_pyramids = {}
+        # One background thread renders previews and full-resolution operations
+        self.render_worker = RenderWorker(
+            lambda channel, gen, result: self.root.after(0, self.on_render_result, channel, gen, result),
+            lambda channel, gen, error: self.root.after(0, self.on_processing_error, channel, gen, error))
         
         # Colormap options
-        self.colormaps = {
-            "Jet": cv2.COLORMAP_JET,
-            "Viridis": cv2.COLORMAP_VIRIDIS,
-            "Plasma": cv2.COLORMAP_PLASMA,
-            "Hot": cv2.COLORMAP_HOT,
-            "Cool": cv2.COLORMAP_COOL,
-            "Rainbow": cv2.COLORMAP_RAINBOW,
-            "Turbo": cv2.COLORMAP_TURBO
-        }
+        self.colormaps = dict(COLORMAPS)
         
         try:
             self.setup_ui()
@@ -166,6 +703,7 @@ class EnhancedApp:
         menubar.add_cascade(label="View", menu=view_menu)
         self.comparison_var = tk.BooleanVar()
         view_menu.add_checkbutton(label="Before/After Comparison", variable=self.comparison_var, command=self.toggle_comparison)
+        view_menu.add_command(label="Zoom Window...", command=self.open_zoom_window, accelerator="Ctrl+Shift+Z")
         
         # Main container
         main_frame = tk.Frame(self.root)
@@ -218,6 +756,14 @@ class EnhancedApp:
         color_frame.pack(fill=tk.X, pady=5)
         
         tk.Button(color_frame, text="Deep Colorize", command=self.do_deep, width=20).pack(pady=2)
+        quality_frame = tk.Frame(color_frame)
+        quality_frame.pack(fill=tk.X, pady=2)
+        tk.Label(quality_frame, text="Quality:").pack(side=tk.LEFT)
+        self.deep_quality_var = tk.StringVar(value="Standard")
+        quality_combo = ttk.Combobox(quality_frame, textvariable=self.deep_quality_var,
+                                     values=list(DEEP_QUALITY), state="readonly", width=12)
+        quality_combo.pack(side=tk.LEFT, padx=5)
+        quality_combo.bind("<<ComboboxSelected>>", self.on_deep_quality_change)
         tk.Button(color_frame, text="Pseudocolor", command=self.do_pseudocolor, width=20).pack(pady=2)
         
         # Colormap selection
@@ -225,9 +771,10 @@ class EnhancedApp:
         colormap_frame.pack(fill=tk.X, pady=2)
         tk.Label(colormap_frame, text="Colormap:").pack(side=tk.LEFT)
         self.colormap_var = tk.StringVar(value="Jet")
-        colormap_combo = ttk.Combobox(colormap_frame, textvariable=self.colormap_var, 
-                                     values=list(self.colormaps.keys()), state="readonly", width=12)
-        colormap_combo.pack(side=tk.LEFT, padx=5)
+        self.colormap_combo = ttk.Combobox(colormap_frame, textvariable=self.colormap_var, 
+                                           values=list(self.colormaps.keys()), state="readonly", width=12)
+        self.colormap_combo.pack(side=tk.LEFT, padx=5)
+        tk.Button(colormap_frame, text="Load...", command=self.load_colormap).pack(side=tk.LEFT)
         
         # Undo/Redo buttons
         undo_frame = tk.Frame(left_panel)
@@ -259,6 +806,7 @@ class EnhancedApp:
         self.panel_output = tk.Label(self.output_frame, text="No image loaded", bg="gray90")
         self.panel_output.pack(fill=tk.BOTH, expand=True)
         self.output_frame.pack(fill=tk.BOTH, expand=True, padx=2)
+        self.display_frame.bind("<Configure>", self.on_display_resize)
         
         # Status bar
         self.status_bar = tk.Label(self.root, text="Ready | No image loaded", bd=1, relief=tk.SUNKEN, anchor=tk.W)
@@ -296,10 +844,27 @@ class EnhancedApp:
         self.root.bind('<Control-y>', lambda e: self.redo())
         self.root.bind('<Control-r>', lambda e: self.reset_view())
         self.root.bind('<Escape>', lambda e: self.cancel_operation())
+        self.root.bind('<Control-Z>', lambda e: self.open_zoom_window())
     
+    @property
+    def img_bgr(self):
+        """The loaded image as BGR; for grayscale sources it is only built when an operation needs it"""
+        if self._img_bgr is None and self.img_gray is not None:
+            self._img_bgr = cv2.cvtColor(self.img_gray, cv2.COLOR_GRAY2BGR)
+        return self._img_bgr
+
+    @img_bgr.setter
+    def img_bgr(self, img):
+        self._img_bgr = img
+
+    def channelwise_source(self):
+        """Input for operations that treat channels alike (gamma, sharpen): grayscale
+        sources are processed single-channel, the result is the same as on BGR"""
+        return self.img_gray if self._img_bgr is None else self._img_bgr
+
     def update_status(self, message):
-        if self.img_bgr is not None:
-            h, w = self.img_bgr.shape[:2]
+        if self.img_gray is not None:
+            h, w = self.img_gray.shape[:2]
             size_mb = os.path.getsize(self.current_file_path) / (1024*1024) if self.current_file_path else 0
             info = f"Image: {w}x{h} | Size: {size_mb:.2f} MB | {message}"
         else:
@@ -329,61 +894,139 @@ class EnhancedApp:
             self.update_status("Single view - showing output only")
     
     def show_image(self, img, panel=None):
+        """Show img scaled to fit its panel; the scaled copy is cached (see display_cache.py)"""
         if panel is None:
             panel = self.panel_output
-        
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        # Get panel size for proper scaling
-        panel.update_idletasks()
         # Get the frame that contains the panel for size calculation
         frame = panel.master
         frame.update_idletasks()
         frame_width = frame.winfo_width() if frame.winfo_width() > 1 else 400
         frame_height = frame.winfo_height() if frame.winfo_height() > 1 else 400
-        
-        # Maintain aspect ratio
-        h, w = img_rgb.shape[:2]
-        scale = min(frame_width/w, frame_height/h, 1.0)
-        new_w, new_h = int(w*scale), int(h*scale)
-        
-        img_pil = Image.fromarray(img_rgb).resize((new_w, new_h), Image.BICUBIC)
-        tkimg = ImageTk.PhotoImage(img_pil)
-        panel.config(image=tkimg, text="")
-        # Keep reference to prevent garbage collection
-        panel.image = tkimg
+        self.display.show(panel, img, frame_width, frame_height)
+        if self.zoom_window is not None and panel is self.panel_output and img is self.img_output:
+            self.zoom_window.set_image(img)
     
-    def save_to_history(self):
+    def open_zoom_window(self):
+        """Zoomable full-resolution view of the output; slider previews there run
+        on the visible part of the full-resolution source"""
+        if self.zoom_window is not None:
+            self.zoom_window.top.lift()
+            return
+        # Region previews are processed on the render worker, not the Tk thread
+        self.zoom_window = ZoomWindow(self.root, on_close=self.on_zoom_window_closed,
+                                      submit=lambda job: self.render_worker.submit("zoom", job))
         if self.img_output is not None:
-            # Remove any future history if we're not at the end
-            if self.history_index < len(self.history) - 1:
-                self.history = self.history[:self.history_index + 1]
-            self.history.append(self.img_output.copy())
-            self.history_index = len(self.history) - 1
-            # Limit history size
-            if len(self.history) > 20:
-                self.history.pop(0)
-                self.history_index -= 1
+            self.zoom_window.top.update_idletasks()
+            self.zoom_window.set_image(self.img_output)
+    
+    def on_zoom_window_closed(self):
+        self.render_worker.cancel("zoom")
+        self.zoom_window = None
+        self._source_pyramids = {}
+    
+    def source_pyramid(self, kind):
+        """Pyramid of the loaded image as gray or, for color sources, BGR, built on first use"""
+        if kind == "bgr" and self._img_bgr is None:
+            kind = "gray"
+        if kind not in self._source_pyramids:
+            self._source_pyramids[kind] = ImagePyramid(self.img_gray if kind == "gray" else self._img_bgr)
+        return self._source_pyramids[kind]
+    
+    def preview_zoom_window(self, op, src):
+        """Mirror a slider preview in the zoom window, on the visible region only
+        (op as for ZoomWindow.preview)"""
+        pyramid = self.source_pyramid("gray" if src is self.preview_gray else "bgr")
+        if src is not self.preview_gray and pyramid.image.ndim == 2:
+            # Grayscale source, color operation: convert just the region
+            def op_bgr(scale):
+                func, args = op(scale)
+                return (lambda region, *a: func(cv2.cvtColor(region, cv2.COLOR_GRAY2BGR), *a)), args
+            self.zoom_window.preview(pyramid, op_bgr)
+        else:
+            self.zoom_window.preview(pyramid, op)
+    
+    def on_display_resize(self, event=None):
+        """Redraw the panels at the new size once resizing has settled"""
+        if self._resize_after_id is not None:
+            self.root.after_cancel(self._resize_after_id)
+        self._resize_after_id = self.root.after(RESIZE_DEBOUNCE_MS, self.refresh_display)
+    
+    def refresh_display(self):
+        self._resize_after_id = None
+        panels = (self.panel_original, self.panel_output) if self.comparison_var.get() else (self.panel_output,)
+        for panel in panels:
+            img = self.display.shown(panel)
+            if img is not None:
+                self.show_image(img, panel)
+    
+    def build_preview_proxy(self):
+        """Downscale the loaded image once to the display size; slider previews
+        run on this proxy and only the apply buttons process full resolution"""
+        self.display_frame.update_idletasks()
+        max_w = self.display_frame.winfo_width() if self.display_frame.winfo_width() > 1 else 800
+        max_h = self.display_frame.winfo_height() if self.display_frame.winfo_height() > 1 else 800
+        h, w = self.img_gray.shape[:2]
+        scale = min(max_w/w, max_h/h, 1.0)
+        self.preview_scale = scale
+        if scale < 1.0:
+            size = (max(int(w*scale), 1), max(int(h*scale), 1))
+            self.preview_gray = cv2.resize(self.img_gray, size, interpolation=cv2.INTER_AREA)
+        else:
+            self.preview_gray = self.img_gray
+        if self._img_bgr is None:
+            # Grayscale source: a color proxy of the small image is all the previews need
+            self.preview_bgr = cv2.cvtColor(self.preview_gray, cv2.COLOR_GRAY2BGR)
+        elif scale < 1.0:
+            self.preview_bgr = cv2.resize(self._img_bgr, size, interpolation=cv2.INTER_AREA)
+        else:
+            self.preview_bgr = self._img_bgr
+    
+    def show_preview(self, out, message):
+        if out.ndim == 2:
+            out = cv2.cvtColor(out, cv2.COLOR_GRAY2BGR)
+        self.show_image(out, self.panel_output)
+        self.update_status(f"{message} (preview - click the button to apply)")
+    
+    def save_to_history(self, recipe=None):
+        """recipe is (func, args) reproducing img_output from the loaded image, which
+        lets the history drop the frame under memory pressure and re-derive it"""
+        if self.img_output is not None:
+            self.history.push(self.img_output, recipe)
             self.update_undo_redo_buttons()
     
     def update_undo_redo_buttons(self):
-        can_undo = self.history_index > 0
-        can_redo = self.history_index < len(self.history) - 1
-        self.undo_btn.config(state="normal" if can_undo else "disabled")
-        self.redo_btn.config(state="normal" if can_redo else "disabled")
+        self.undo_btn.config(state="normal" if self.history.can_undo else "disabled")
+        self.redo_btn.config(state="normal" if self.history.can_redo else "disabled")
     
     def undo(self):
-        if self.history_index > 0:
-            self.history_index -= 1
-            self.img_output = self.history[self.history_index].copy()
-            self.show_image(self.img_output)
-            self.update_undo_redo_buttons()
+        if self.history.can_undo:
+            self.show_history_state(self.history.undo(rebuild=False))
     
     def redo(self):
-        if self.history_index < len(self.history) - 1:
-            self.history_index += 1
-            self.img_output = self.history[self.history_index].copy()
+        if self.history.can_redo:
+            self.show_history_state(self.history.redo(rebuild=False))
+    
+    def show_history_state(self, img):
+        """Show the state undo/redo moved to; a state whose frame the history dropped
+        is re-derived from its recipe on the render worker"""
+        self.update_undo_redo_buttons()
+        if img is None:
+            entry = self.history.current_entry()
+            func, args = entry.recipe
+            self.render_worker.submit("history", lambda token: (entry, run_cancellable(func, *args, token=token)),
+                                      cancellable=True)
+            self.update_status("Rebuilding state...")
+            return
+        self.render_worker.cancel("history")
+        self.img_output = img
+        self.show_image(self.img_output)
+    
+    def on_history_rebuilt(self, result):
+        entry, img = result
+        if self.history.store_frame(entry, img):
+            self.img_output = entry.frame
             self.show_image(self.img_output)
-            self.update_undo_redo_buttons()
+            self.update_status("State restored")
     
     def load_image(self):
         path = filedialog.askopenfilename(
@@ -391,18 +1034,26 @@ class EnhancedApp:
         )
         if not path:
             return
-        img = cv2.imread(path)
-        if img is None:
+        # Grayscale scans stay single-channel (16-bit ones are windowed to 8 bits;
+        # the 16-bit data is kept for pseudocolor)
+        raw = cv2.imread(path, cv2.IMREAD_ANYDEPTH | cv2.IMREAD_ANYCOLOR)
+        if raw is None:
             messagebox.showerror("Error", "Unable to read image")
             return
+        bgr, gray = split_native(raw)
+        img = gray if bgr is None else bgr
         
+        self.cancel_operation()
+        self.render_worker.cancel("preview")
         self.current_file_path = path
-        self.img_bgr = img
-        self.img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        self.img_original = img.copy()
-        self.img_output = img.copy()
-        self.history = [img.copy()]
-        self.history_index = 0
+        self.img_bgr = bgr
+        self.img_gray = gray
+        self.img_gray16 = raw if raw.ndim == 2 and raw.dtype == np.uint16 else None
+        self.build_preview_proxy()
+        self._source_pyramids = {}
+        self.img_original = img
+        self.img_output = img
+        self.history.reset(img)
         self.update_undo_redo_buttons()
         
         # Update display based on comparison mode
@@ -414,35 +1065,71 @@ class EnhancedApp:
             # Show only output
             self.show_image(self.img_output, self.panel_output)
         self.update_status("Image loaded successfully")
+        # Load the colorizer in the background so Deep Colorize is ready when clicked
+        if not colorizer.loaded:
+            threading.Thread(target=colorizer.warmup, daemon=True).start()
     
-    def process_with_progress(self, func, *args):
-        if self.processing:
-            return
+    def process_with_progress(self, func, *args, message="Processing complete"):
+        """Run func(*args) at full resolution on the render worker. A newer request
+        replaces this one; band-able operations stop early when cancelled."""
         self.processing = True
+        self._apply_message = message
+        self._apply_recipe = (func, args)
         self.progress.pack(fill=tk.X, pady=2)
         self.progress.start()
         self.update_status("Processing...")
-        
-        def worker():
-            try:
-                result = func(*args)
-                self.root.after(0, lambda: self.on_processing_done(result))
-            except Exception as e:
-                self.root.after(0, lambda: self.on_processing_error(str(e)))
-        
-        thread = threading.Thread(target=worker, daemon=True)
-        thread.start()
+        self.render_worker.submit("apply", run_cancellable, func, *args, cancellable=True)
+    
+    def schedule_preview(self, func, src, param, message, region=None):
+        """Debounce slider events, then render the preview on the worker.
+        region(scale) gives (func, args) for the zoom window's preview on a pyramid
+        level of that scale (default: func with param); False keeps the output there."""
+        if self._preview_after_id is not None:
+            self.root.after_cancel(self._preview_after_id)
+        def submit():
+            self._preview_after_id = None
+            self.render_worker.submit("preview", lambda: (func(src, param), message))
+            if self.zoom_window is None:
+                return
+            if region is False:
+                self.zoom_window.cancel_preview()
+            else:
+                self.preview_zoom_window(region or (lambda scale: (func, (param,))), src)
+        self._preview_after_id = self.root.after(PREVIEW_DEBOUNCE_MS, submit)
+    
+    def on_render_result(self, channel, generation, result):
+        # Drop results that were superseded after the worker finished them
+        if not self.render_worker.is_current(channel, generation):
+            return
+        if channel == "preview":
+            out, message = result
+            self.show_preview(out, message)
+        elif channel == "zoom":
+            if self.zoom_window is not None:
+                self.zoom_window.show_processed(result)
+        elif channel == "history":
+            self.on_history_rebuilt(result)
+        else:
+            self.on_processing_done(result)
     
     def on_processing_done(self, result):
         self.progress.stop()
         self.progress.pack_forget()
         self.processing = False
+        if result.ndim == 2:
+            result = cv2.cvtColor(result, cv2.COLOR_GRAY2BGR)
         self.img_output = result
-        self.save_to_history()
+        self.save_to_history(self._apply_recipe)
         self.show_image(self.img_output, self.panel_output)
-        self.update_status("Processing complete")
+        self.update_status(self._apply_message)
     
-    def on_processing_error(self, error):
+    def on_processing_error(self, channel, generation, error):
+        if not self.render_worker.is_current(channel, generation):
+            return
+        if channel != "apply":
+            # A failed preview leaves the running operation alone
+            self.update_status(f"{'Undo/redo' if channel == 'history' else 'Preview'} failed: {error}")
+            return
         self.progress.stop()
         self.progress.pack_forget()
         self.processing = False
@@ -455,91 +1142,68 @@ class EnhancedApp:
         if not self.live_preview_var.get():
             return
         strength = float(val)
-        out = ace_enhancement(self.img_gray, strength)
-        self.img_output = cv2.cvtColor(out, cv2.COLOR_GRAY2BGR)
-        self.show_image(self.img_output, self.panel_output)
-        self.update_status(f"ACE Strength: {strength:.2f}")
+        # Shrink the window with the proxy so the preview shows the full-resolution look
+        radius = max(1, round(ACE_RADIUS * self.preview_scale))
+        # The zoom window scales it to the pyramid level it shows instead
+        self.schedule_preview(functools.partial(ace_enhancement, radius=radius), self.preview_gray, strength,
+                              f"ACE Strength: {strength:.2f}",
+                              region=lambda scale: (ace_enhancement, (strength, max(1, round(ACE_RADIUS * scale)))))
     
     def do_ace(self):
         if self.img_gray is None:
             messagebox.showwarning("Warning", "Please load an image first")
             return
         strength = self.ace_slider.get()
-        out = ace_enhancement(self.img_gray, strength)
-        self.img_output = cv2.cvtColor(out, cv2.COLOR_GRAY2BGR)
-        self.save_to_history()
-        self.show_image(self.img_output, self.panel_output)
-        self.update_status("ACE enhancement applied")
+        self.process_with_progress(ace_enhancement, self.img_gray, strength,
+                                   message="ACE enhancement applied")
     
     def on_clahe_slider_change(self, val):
-        if self.img_bgr is None or not self.live_preview_var.get():
+        if self.img_gray is None or not self.live_preview_var.get():
             return
         clip_limit = float(val)
-        out = clahe_enhancement(self.img_bgr, clip_limit)
-        self.img_output = out
-        self.show_image(self.img_output, self.panel_output)
-        self.update_status(f"CLAHE Clip: {clip_limit:.2f}")
+        self.schedule_preview(clahe_enhancement, self.preview_bgr, clip_limit, f"CLAHE Clip: {clip_limit:.2f}")
     
     def do_clahe(self):
-        if self.img_bgr is None:
+        if self.img_gray is None:
             messagebox.showwarning("Warning", "Please load an image first")
             return
         clip_limit = self.clahe_slider.get()
-        out = clahe_enhancement(self.img_bgr, clip_limit)
-        self.img_output = out
-        self.save_to_history()
-        self.show_image(self.img_output, self.panel_output)
-        self.update_status("CLAHE enhancement applied")
+        self.process_with_progress(clahe_enhancement, self.img_bgr, clip_limit,
+                                   message="CLAHE enhancement applied")
     
     def on_gamma_slider_change(self, val):
-        if self.img_bgr is None or not self.live_preview_var.get():
+        if self.img_gray is None or not self.live_preview_var.get():
             return
         gamma = float(val)
-        out = gamma_correction(self.img_bgr, gamma)
-        self.img_output = out
-        self.show_image(self.img_output, self.panel_output)
-        self.update_status(f"Gamma: {gamma:.2f}")
+        self.schedule_preview(gamma_correction, self.preview_bgr, gamma, f"Gamma: {gamma:.2f}")
     
     def do_gamma(self):
-        if self.img_bgr is None:
+        if self.img_gray is None:
             messagebox.showwarning("Warning", "Please load an image first")
             return
         gamma = self.gamma_slider.get()
-        out = gamma_correction(self.img_bgr, gamma)
-        self.img_output = out
-        self.save_to_history()
-        self.show_image(self.img_output, self.panel_output)
-        self.update_status(f"Gamma correction applied (γ={gamma:.2f})")
+        self.process_with_progress(gamma_correction, self.channelwise_source(), gamma,
+                                   message=f"Gamma correction applied (γ={gamma:.2f})")
     
     def do_sharpen(self):
-        if self.img_bgr is None:
+        if self.img_gray is None:
             messagebox.showwarning("Warning", "Please load an image first")
             return
-        out = sharpen(self.img_bgr)
-        self.img_output = out
-        self.save_to_history()
-        self.show_image(self.img_output, self.panel_output)
-        self.update_status("Sharpening applied")
+        self.process_with_progress(sharpen, self.channelwise_source(), message="Sharpening applied")
     
     def on_sat_slider_change(self, val):
-        if self.img_bgr is None or not self.live_preview_var.get():
+        if self.img_gray is None or not self.live_preview_var.get():
             return
         factor = float(val)
-        out = saturation_boost(self.img_bgr, factor)
-        self.img_output = out
-        self.show_image(self.img_output, self.panel_output)
-        self.update_status(f"Saturation: {factor:.2f}")
+        self.schedule_preview(saturation_boost, self.preview_bgr, factor, f"Saturation: {factor:.2f}")
     
     def do_sat(self):
-        if self.img_bgr is None:
+        if self.img_gray is None:
             messagebox.showwarning("Warning", "Please load an image first")
             return
         factor = self.sat_slider.get()
-        out = saturation_boost(self.img_bgr, factor)
-        self.img_output = out
-        self.save_to_history()
-        self.show_image(self.img_output, self.panel_output)
-        self.update_status(f"Saturation boost applied (factor={factor:.2f})")
+        self.process_with_progress(saturation_boost, self.img_bgr, factor,
+                                   message=f"Saturation boost applied (factor={factor:.2f})")
     
     def do_pseudocolor(self):
         if self.img_gray is None:
@@ -547,17 +1211,50 @@ class EnhancedApp:
             return
         colormap_name = self.colormap_var.get()
         colormap = self.colormaps[colormap_name]
-        out = pseudocolor(self.img_gray, colormap)
-        self.img_output = out
-        self.save_to_history()
-        self.show_image(self.img_output, self.panel_output)
-        self.update_status(f"Pseudocolor applied ({colormap_name})")
+        # 16-bit sources are colored from the full range, not the 8-bit copy. The window
+        # is taken from the whole image so the bands all use the same one.
+        gray = self.img_gray if self.img_gray16 is None else self.img_gray16
+        window = auto_window(gray) if gray.dtype == np.uint16 else (0, 255)
+        self.process_with_progress(pseudocolor, gray, colormap, window,
+                                   message=f"Pseudocolor applied ({colormap_name})")
+    
+    def load_colormap(self):
+        path = filedialog.askopenfilename(
+            filetypes=[("Colormaps", "*.npy"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            cmap = Colormap.load(path)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Error", f"Unable to load colormap: {e}")
+            return
+        self.colormaps[cmap.name] = cmap
+        self.colormap_combo["values"] = list(self.colormaps.keys())
+        self.colormap_var.set(cmap.name)
+        self.update_status(f"Colormap '{cmap.name}' loaded ({len(cmap.positions)} points)")
+    
+    def deep_quality(self):
+        """deep_colorize with the inference size and ab upsampling of the selected preset"""
+        size, upsample = DEEP_QUALITY[self.deep_quality_var.get()]
+        return functools.partial(deep_colorize, size=size, upsample=upsample), size
+    
+    def on_deep_quality_change(self, event=None):
+        if not self.live_preview_var.get() or self.img_gray is None or self.processing:
+            return
+        # Preview on the display proxy; the small network input keeps "Fast" interactive
+        func, size = self.deep_quality()
+        # No region preview: a network pass per pan step would stall the zoom window
+        self.schedule_preview(lambda gray, _: func(gray), self.preview_gray, None,
+                              f"Deep colorization: {self.deep_quality_var.get()} ({size}px)", region=False)
     
     def do_deep(self):
         if self.img_gray is None:
             messagebox.showwarning("Warning", "Please load an image first")
             return
-        self.process_with_progress(deep_colorize, self.img_gray)
+        func, size = self.deep_quality()
+        self.process_with_progress(func, self.img_gray,
+                                   message=f"Deep colorization complete ({self.deep_quality_var.get()}, {size}px)")
     
     def save_output(self):
         if self.img_output is None:
@@ -574,16 +1271,17 @@ class EnhancedApp:
         self.update_status(f"Saved to {os.path.basename(path)}")
     
     def reset_view(self):
-        if self.img_bgr is not None:
-            self.img_output = self.img_bgr.copy()
-            self.history = [self.img_bgr.copy()]
-            self.history_index = 0
+        if self.img_original is not None:
+            self.cancel_operation()
+            self.img_output = self.img_original
+            self.history.reset(self.img_original)
             self.update_undo_redo_buttons()
             self.show_image(self.img_output, self.panel_output)
             self.update_status("View reset")
     
     def cancel_operation(self):
         if self.processing:
+            self.render_worker.cancel("apply")
             self.progress.stop()
             self.progress.pack_forget()
             self.processing = False
@@ -591,6 +1289,7 @@ class EnhancedApp:
     
     def on_closing(self):
         print("Window closing...")
+        self.render_worker.shutdown()
         self.root.quit()
         self.root.destroy()
 
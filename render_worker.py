@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+render_worker.py
+A single persistent background thread for GUI rendering.
+- Requests go to named channels (e.g. "preview", "apply"); within a channel
+  only the latest request is kept, older pending ones are dropped
+- Every request gets a generation number; a newer request cancels the token
+  of the running one, and results whose generation is stale are discarded
+- Jobs that accept a token (tiling.CancelToken) can stop part way through
+"""
+
+import threading
+
+from tiling import CancelledError, CancelToken
+
+class RenderWorker:
+    def __init__(self, on_result, on_error=None, priority=("apply", "preview")):
+        """on_result(channel, generation, result) and on_error(channel, generation, message)
+        are called from the worker thread; GUI code should hand them to the Tk loop."""
+        self.on_result = on_result
+        self.on_error = on_error
+        self.priority = list(priority)
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._generation = {}
+        self._tokens = {}
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, channel, func, *args, cancellable=False):
+        """Queue func(*args) (plus token=... if cancellable) and return its generation"""
+        with self._cond:
+            generation = self._bump(channel)
+            self._pending[channel] = (generation, func, args, cancellable)
+            self._cond.notify()
+        return generation
+
+    def cancel(self, channel):
+        """Drop the pending request and stop the running one for this channel"""
+        with self._cond:
+            self._bump(channel)
+            self._pending.pop(channel, None)
+
+    def is_current(self, channel, generation):
+        with self._cond:
+            return self._generation.get(channel) == generation
+
+    def busy(self, channel):
+        with self._cond:
+            return channel in self._pending or channel in self._tokens
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            for token in self._tokens.values():
+                token.cancel()
+            self._cond.notify()
+
+    def _bump(self, channel):
+        generation = self._generation.get(channel, 0) + 1
+        self._generation[channel] = generation
+        token = self._tokens.get(channel)
+        if token is not None:
+            token.cancel()
+        return generation
+
+    def _next_request(self):
+        for channel in self.priority + [c for c in self._pending if c not in self.priority]:
+            if channel in self._pending:
+                return channel, self._pending.pop(channel)
+        return None, None
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                channel, (generation, func, args, cancellable) = self._next_request()
+                token = CancelToken()
+                self._tokens[channel] = token
+            try:
+                result = func(*args, token=token) if cancellable else func(*args)
+                error = None
+            except CancelledError:
+                result = error = None
+                token.cancel()
+            except Exception as e:
+                result, error = None, str(e)
+            with self._cond:
+                self._tokens.pop(channel, None)
+                stale = token.cancelled or self._generation.get(channel) != generation
+            if stale:
+                continue
+            if error is not None:
+                if self.on_error is not None:
+                    self.on_error(channel, generation, error)
+            else:
+                self.on_result(channel, generation, result)
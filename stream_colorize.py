@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+stream_colorize.py
+Pseudocolor/colorize video files, cameras and image sequences frame by frame.
+- Decode, process and encode run on separate threads joined by bounded queues,
+  so reading and writing overlap with the (usually dominant) processing stage
+- File sources never lose frames: a full queue makes the reader wait (backpressure);
+  live sources (cameras, streams or --drop) drop the newest frame instead of falling behind
+- Prints sustained FPS, per-stage timings, queue waits and dropped frames
+- With --keyframe-interval the network only runs on keyframes and changed frames
+  (see temporal.py); by default every frame is inferred
+
+Examples:
+    python stream_colorize.py thermal.mp4 -o thermal_color.mp4 -p "clahe,pseudocolor:hot"
+    python stream_colorize.py frames/ -o colorized/ -p deep
+    python stream_colorize.py lab.mp4 -o lab_color.mp4 -p deep --keyframe-interval 30 --warp
+    python stream_colorize.py 0 -o camera.avi -p "clahe,pseudocolor:jet" --max-frames 600
+"""
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+
+from batch_colorize import IMAGE_EXTS
+from pipeline import CompiledPipeline, parse_pipeline, uses_dnn
+from pseudo_color_app_enhanced import AB_UPSAMPLE_MODES, colorizer, set_deep_defaults
+from temporal import TemporalColorizer
+
+VIDEO_EXTS = (".mp4", ".avi", ".mkv", ".mov", ".m4v", ".wmv")
+DEFAULT_FPS = 25.0
+
+# ---------------------------
+# Sources and sinks
+# ---------------------------
+class ImageSequence:
+    """Directory of still images, read in name order with a VideoCapture-like interface"""
+    def __init__(self, directory):
+        self.files = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                            if f.lower().endswith(IMAGE_EXTS))
+        self.pos = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self):
+        while self.pos < len(self.files):
+            img = cv2.imread(self.files[self.pos])
+            self.pos += 1
+            if img is not None:
+                return True, img
+        return False, None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.files)
+        return 0.0
+
+    def release(self):
+        pass
+
+def open_source(source):
+    """Return (capture, fps, live) for a video file, printf pattern, image directory or camera index"""
+    if os.path.isdir(source):
+        return ImageSequence(source), None, False
+    if source.isdigit():
+        return cv2.VideoCapture(int(source)), None, True
+    cap = cv2.VideoCapture(source)
+    live = "://" in source
+    return cap, cap.get(cv2.CAP_PROP_FPS) or None, live
+
+class FrameWriter:
+    """cv2.VideoWriter for video file names, numbered PNGs for anything else (a directory)"""
+    def __init__(self, path, fps, fourcc="mp4v"):
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+        self.count = 0
+        self.is_video = path.lower().endswith(VIDEO_EXTS)
+        if not self.is_video:
+            os.makedirs(path, exist_ok=True)
+
+    def write(self, frame):
+        if not self.is_video:
+            if not cv2.imwrite(os.path.join(self.path, f"frame_{self.count:06d}.png"), frame):
+                raise IOError(f"Unable to write frame {self.count} to {self.path}")
+        else:
+            if self.writer is None:
+                h, w = frame.shape[:2]
+                self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc),
+                                              self.fps, (w, h), frame.ndim == 3)
+                if not self.writer.isOpened():
+                    raise IOError(f"Unable to open video writer for {self.path} ({self.fourcc})")
+            self.writer.write(frame)
+        self.count += 1
+
+    def release(self):
+        if self.writer is not None:
+            self.writer.release()
+
+# ---------------------------
+# Pipelined stages
+# ---------------------------
+class StageStats:
+    def __init__(self):
+        self.frames = 0
+        self.busy = 0.0      # seconds spent doing the stage's own work
+        self.wait_in = 0.0   # seconds waiting for input (starved)
+        self.wait_out = 0.0  # seconds blocked on a full output queue (backpressure)
+
+    def ms_per_frame(self):
+        return 1e3 * self.busy / self.frames if self.frames else 0.0
+
+_END = object()
+
+class StreamRunner:
+    def __init__(self, capture, process, writer, queue_size=8, drop=False, max_frames=0):
+        self.capture = capture
+        self.process = process
+        self.writer = writer
+        self.drop = drop
+        self.max_frames = max_frames
+        self.decoded = queue.Queue(queue_size)
+        self.processed = queue.Queue(queue_size)
+        self.stats = {name: StageStats() for name in ("decode", "process", "encode")}
+        self.dropped = 0
+        self.max_depth = {"decoded": 0, "processed": 0}
+        self.error = None
+        self._stop = threading.Event()
+
+    def _put(self, q, item, stats, name, may_drop=False):
+        self.max_depth[name] = max(self.max_depth[name], q.qsize())
+        if may_drop:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                self.dropped += 1
+                return
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        stats.wait_out += time.perf_counter() - start
+
+    def _get(self, q, stats):
+        start = time.perf_counter()
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._stop.is_set():
+                    item = _END
+                    break
+        stats.wait_in += time.perf_counter() - start
+        return item
+
+    def _fail(self, error):
+        if self.error is None:
+            self.error = error
+        self._stop.set()
+
+    def _decode(self):
+        stats = self.stats["decode"]
+        try:
+            while not self._stop.is_set():
+                if self.max_frames and stats.frames >= self.max_frames:
+                    break
+                start = time.perf_counter()
+                ok, frame = self.capture.read()
+                stats.busy += time.perf_counter() - start
+                if not ok:
+                    break
+                stats.frames += 1
+                self._put(self.decoded, frame, stats, "decoded", may_drop=self.drop)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.decoded, _END, stats, "decoded")
+
+    def _process(self):
+        stats = self.stats["process"]
+        try:
+            while True:
+                frame = self._get(self.decoded, stats)
+                if frame is _END:
+                    break
+                start = time.perf_counter()
+                # The pipeline reuses its buffers, so hand the encoder a private copy
+                out = self.process(frame).copy()
+                stats.busy += time.perf_counter() - start
+                stats.frames += 1
+                self._put(self.processed, out, stats, "processed")
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.processed, _END, stats, "processed")
+
+    def _encode(self):
+        stats = self.stats["encode"]
+        try:
+            while True:
+                frame = self._get(self.processed, stats)
+                if frame is _END:
+                    break
+                start = time.perf_counter()
+                self.writer.write(frame)
+                stats.busy += time.perf_counter() - start
+                stats.frames += 1
+        except Exception as e:
+            self._fail(e)
+
+    def run(self, report_every=5.0, log=print):
+        threads = [threading.Thread(target=t, daemon=True) for t in (self._decode, self._process, self._encode)]
+        self.start = time.perf_counter()
+        for t in threads:
+            t.start()
+        encode = threads[-1]
+        try:
+            while encode.is_alive():
+                encode.join(report_every)
+                if encode.is_alive() and log:
+                    log(self.progress())
+        except KeyboardInterrupt:
+            self._stop.set()
+            encode.join()
+        for t in threads:
+            t.join()
+        self.elapsed = time.perf_counter() - self.start
+        if self.error is not None:
+            raise self.error
+        return self.stats["encode"].frames
+
+    def fps(self):
+        elapsed = getattr(self, "elapsed", None) or time.perf_counter() - self.start
+        return self.stats["encode"].frames / elapsed if elapsed > 0 else 0.0
+
+    def progress(self):
+        return (f"Progress: {self.stats['encode'].frames} frames written, {self.dropped} dropped, "
+                f"{self.fps():.1f} FPS, queues {self.decoded.qsize()}/{self.processed.qsize()}")
+
+    def summary(self):
+        lines = [f"Finished: {self.stats['encode'].frames} frames in {self.elapsed:.1f}s, "
+                 f"{self.fps():.2f} FPS sustained, {self.dropped} dropped"]
+        for name, s in self.stats.items():
+            lines.append(f"  {name:<8} {s.frames:6d} frames  {s.ms_per_frame():8.2f} ms/frame  "
+                         f"waiting for input {s.wait_in:6.1f}s  blocked on output {s.wait_out:6.1f}s")
+        bottleneck = max(self.stats, key=lambda n: self.stats[n].busy)
+        lines.append(f"  max queue depth decoded/processed: {self.max_depth['decoded']}/"
+                     f"{self.max_depth['processed']} of {self.decoded.maxsize}; bottleneck: {bottleneck}")
+        return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pseudocolor or colorize a video, camera or image sequence.")
+    parser.add_argument("source", help="video file, image directory, printf pattern (frames/%%05d.png), "
+                                       "stream URL or camera index")
+    parser.add_argument("-o", "--output", required=True,
+                        help=f"output video ({', '.join(VIDEO_EXTS)}) or directory for PNG frames")
+    parser.add_argument("-p", "--pipeline", default="clahe,pseudocolor",
+                        help="ordered operations, see batch_colorize.py (default: clahe,pseudocolor)")
+    parser.add_argument("--fps", type=float, default=0, help="output frame rate (default: source rate)")
+    parser.add_argument("--fourcc", default="mp4v", help="video codec FourCC (default: mp4v)")
+    parser.add_argument("--queue-size", type=int, default=8, help="frames buffered between stages (default: 8)")
+    parser.add_argument("--drop", action="store_true",
+                        help="drop frames instead of waiting when processing falls behind (default for cameras)")
+    parser.add_argument("--max-frames", type=int, default=0, help="stop after this many frames")
+    parser.add_argument("--keyframe-interval", type=int, default=1,
+                        help="deep: run the network at least every N frames and reuse its chroma "
+                             "in between (default: 1, every frame)")
+    parser.add_argument("--reuse-threshold", type=float, default=3.0,
+                        help="deep: mean lightness change (L units, at the network input size) that forces "
+                             "a new inference (default: 3.0)")
+    parser.add_argument("--warp", action="store_true", help="deep: move reused chroma along optical flow")
+    parser.add_argument("--dnn-size", type=int, help="deep: network input size in pixels (default: 224)")
+    parser.add_argument("--ab-upsample", choices=AB_UPSAMPLE_MODES,
+                        help="deep: bilinear or lightness-guided chroma upsampling (default: bilinear)")
+    args = parser.parse_args(argv)
+
+    try:
+        steps = parse_pipeline(args.pipeline)
+        set_deep_defaults(args.dnn_size, args.ab_upsample)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.keyframe_interval < 1:
+        parser.error(f"--keyframe-interval must be at least 1, got {args.keyframe_interval}")
+    if args.reuse_threshold < 0:
+        parser.error(f"--reuse-threshold must not be negative, got {args.reuse_threshold}")
+
+    capture, source_fps, live = open_source(args.source)
+    if not capture.isOpened():
+        print(f"Unable to open {args.source}", file=sys.stderr)
+        return 1
+    if uses_dnn(steps):
+        colorizer.warmup()
+    temporal = None
+    if uses_dnn(steps) and args.keyframe_interval > 1:
+        temporal = TemporalColorizer(args.keyframe_interval, args.reuse_threshold, args.warp)
+    plan = CompiledPipeline(steps, deep=temporal)
+    writer = FrameWriter(args.output, args.fps or source_fps or DEFAULT_FPS, args.fourcc)
+    runner = StreamRunner(capture, plan.run, writer, max(args.queue_size, 1),
+                          drop=args.drop or live, max_frames=args.max_frames)
+    print(f"Streaming {args.source} -> {args.output}: {args.pipeline}"
+          f"{' (dropping frames when behind)' if runner.drop else ''}")
+    try:
+        runner.run()
+    except Exception as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+    finally:
+        capture.release()
+        writer.release()
+    print(runner.summary())
+    if temporal is not None:
+        print(f"  deep: {temporal.stats()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+temporal.py
+Deep colorization of consecutive video frames with reuse of the network's chroma.
+- The network runs on keyframes: the first frame, every keyframe_interval frames,
+  and whenever the lightness differs from the last inferred frame by more than threshold
+  (compared at the network input size, INFERENCE_SIZE square)
+- Frames in between reuse the cached low-resolution ab map with their own lightness,
+  which also removes the frame-to-frame colour flicker of per-frame inference
+- With warp=True the cached ab is moved along Farneback optical flow first,
+  for footage with camera or object motion
+- keyframe_interval=1 runs the network on every frame, i.e. the same output as deep_colorize
+"""
+
+import cv2
+import numpy as np
+
+import pseudo_color_app_enhanced as app
+
+class TemporalColorizer:
+    def __init__(self, keyframe_interval=30, threshold=3.0, warp=False):
+        """threshold is the mean absolute difference of the lightness resized to the
+        network input (INFERENCE_SIZE square, 8-bit L units) above which a frame is inferred again"""
+        if keyframe_interval < 1:
+            raise ValueError(f"Keyframe interval must be at least 1, got {keyframe_interval}")
+        if threshold < 0:
+            raise ValueError(f"Reuse threshold must not be negative, got {threshold}")
+        self.keyframe_interval = keyframe_interval
+        self.threshold = threshold
+        self.warp = warp
+        self.inferred = 0
+        self.reused = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the cached chroma, e.g. at a scene cut or when seeking"""
+        self._key_L = None
+        self._key_ab = None
+        self._key_ab_full = None
+        self._since_key = 0
+
+    def _needs_inference(self, L_rs):
+        if self._key_ab is None or self.keyframe_interval <= 1 or self._key_L.shape != L_rs.shape:
+            return True
+        if self._since_key >= self.keyframe_interval:
+            return True
+        return float(cv2.norm(L_rs, self._key_L, cv2.NORM_L1)) / L_rs.size > self.threshold
+
+    def _warped_ab(self, L_rs):
+        """Cached ab moved onto the current frame by the flow from the current to the key lightness"""
+        h, w = L_rs.shape
+        if self._key_ab_full is None:
+            self._key_ab_full = cv2.resize(self._key_ab, (w, h))
+            self._grid = np.dstack(np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32)))
+        cur = np.clip(L_rs + 50, 0, 255).astype(np.uint8)
+        key = np.clip(self._key_L + 50, 0, 255).astype(np.uint8)
+        flow = cv2.calcOpticalFlowFarneback(cur, key, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+        flow += self._grid
+        return cv2.remap(self._key_ab_full, flow, None, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    def __call__(self, gray_img):
+        if app.colorizer.get() is None:
+            return app.pseudocolor(gray_img)
+        L, L_rs = app.prepare_lab_image(gray_img, app.INFERENCE_SIZE)
+        if self._needs_inference(L_rs):
+            self._key_L = L_rs
+            self._key_ab = app.predict_ab(L_rs)
+            self._key_ab_full = None
+            self._since_key = 1
+            self.inferred += 1
+            return app.compose_colorized(L, self._key_ab)
+        self._since_key += 1
+        self.reused += 1
+        ab = self._warped_ab(L_rs) if self.warp else self._key_ab
+        return app.compose_colorized(L, ab)
+
+    def stats(self):
+        total = self.inferred + self.reused
+        share = self.reused / total if total else 0.0
+        return f"network ran on {self.inferred}/{total} frames ({share:.0%} reused)"
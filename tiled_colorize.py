@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+tiled_colorize.py
+Out-of-core processing for images too large to hold in memory (gigapixel
+microscopy and satellite scans).
+- Images live in memory-mapped .npy files; every pipeline step reads its input
+  and writes its output tile by tile, so peak memory follows the tile size
+- Neighbourhood operations read each tile with a halo (tiling.halo_for), which
+  makes ACE and sharpen identical to processing the whole image
+- CLAHE first streams the tiles to build OpenCV's per-cell lookup tables for
+  the whole image, then interpolates them tile by tile (identical results)
+- Deep colorization samples the network input (--dnn-size, default 224) from
+  the memmap, runs it through the same cached network call as the other tools
+  (--cache-dir, see ab_cache.py) and upsamples the chroma bilinearly tile by
+  tile (the network input can differ from the in-memory path by one grey
+  level, since cv2.resize rounds in fixed point)
+- Pseudocolor of 16-bit data looks each pixel up at full depth through a window
+  taken from a histogram of the whole image (as app.pseudocolor does in memory);
+  the other operations work on the top 8 bits
+
+Inputs: .npy (opened memory-mapped), uncompressed TIFF via the optional
+tifffile package, or any format cv2 can read (decoded once into a memmap).
+
+Example:
+    python tiled_colorize.py slide.tif -o slide_color.npy -p "clahe:2.0,sharpen,deep" --tile 2048
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import pseudo_color_app_enhanced as app
+from pipeline import OPERATIONS, as_kind, call, param_args, parse_pipeline, uses_dnn
+from tiling import halo_for
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+# ---------------------------
+# Backing store
+# ---------------------------
+def open_image(path, workdir):
+    """Return a read-only memory-mapped array (gray or BGR) for path"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return np.load(path, mmap_mode="r")
+    if ext in (".tif", ".tiff") and tifffile is not None:
+        try:
+            arr = tifffile.memmap(path, mode="r")
+            if arr.ndim == 3 and arr.shape[2] >= 3:
+                # tifffile returns RGB(A); expose BGR without loading the data
+                arr = arr[:, :, 2::-1]
+            return arr
+        except ValueError:
+            pass  # compressed or non-contiguous TIFF: fall back to a one-off decode
+    img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise IOError(f"Unable to read {path}")
+    store = np.lib.format.open_memmap(os.path.join(workdir, "source.npy"), mode="w+",
+                                      dtype=img.dtype, shape=img.shape)
+    store[:] = img
+    del img
+    store.flush()
+    return store
+
+def gray_tile(tile):
+    """Single-channel tile at its stored depth"""
+    if tile.ndim == 3 and tile.shape[2] == 4:
+        tile = tile[:, :, :3]
+    return as_kind(np.ascontiguousarray(tile), "gray")
+
+def to_uint8(tile):
+    """Drop alpha and bring 16-bit data to 8 bits, as the enhancement functions expect"""
+    if tile.ndim == 3 and tile.shape[2] == 4:
+        tile = tile[:, :, :3]
+    if tile.dtype == np.uint16:
+        tile = (tile >> 8).astype(np.uint8)
+    return np.ascontiguousarray(tile)
+
+def tile_ranges(height, width, tile):
+    for y0 in range(0, height, tile):
+        for x0 in range(0, width, tile):
+            yield y0, min(y0 + tile, height), x0, min(x0 + tile, width)
+
+def reflect101(idx, size):
+    """Index mapping of cv2.BORDER_REFLECT_101 for coordinates past the end"""
+    return np.where(idx >= size, 2 * size - 2 - idx, idx)
+
+# ---------------------------
+# Tiled operations
+# ---------------------------
+def run_neighbourhood(func, param, kind, src, dst, tile, halo):
+    h, w = src.shape[:2]
+    for y0, y1, x0, x1 in tile_ranges(h, w, tile):
+        top, left = max(y0 - halo, 0), max(x0 - halo, 0)
+        region = as_kind(to_uint8(src[top:min(y1 + halo, h), left:min(x1 + halo, w)]), kind)
+        out = call(func, region, param)
+        dst[y0:y1, x0:x1] = out[y0 - top:y1 - top, x0 - left:x1 - left]
+
+def clahe_cell_luts(src, clip_limit, tile, grid=(8, 8)):
+    """Per-cell lookup tables exactly as cv2.createCLAHE builds them for the L channel,
+    accumulated tile by tile over the (virtually padded) image"""
+    h, w = src.shape[:2]
+    gy, gx = grid
+    # OpenCV pads both axes (by a full cell on divisible ones) if either is not divisible
+    padded = (h + gy - h % gy, w + gx - w % gx) if (h % gy or w % gx) else (h, w)
+    th, tw = padded[0] // gy, padded[1] // gx
+    hists = np.zeros((gy, gx, 256), np.int64)
+    for y0, y1, x0, x1 in tile_ranges(padded[0], padded[1], tile):
+        rows = reflect101(np.arange(y0, y1), h)
+        cols = reflect101(np.arange(x0, x1), w)
+        if y1 <= h and x1 <= w:
+            region = src[y0:y1, x0:x1]
+        else:
+            region = src[rows.min():rows.max() + 1][:, cols.min():cols.max() + 1]
+            region = region[rows - rows.min()][:, cols - cols.min()]
+        L = lightness(to_uint8(region))
+        for cy in range(y0 // th, (y1 - 1) // th + 1):
+            for cx in range(x0 // tw, (x1 - 1) // tw + 1):
+                block = L[max(cy*th, y0) - y0:min((cy+1)*th, y1) - y0,
+                          max(cx*tw, x0) - x0:min((cx+1)*tw, x1) - x0]
+                hists[cy, cx] += np.bincount(block.ravel(), minlength=256)
+    area = th * tw
+    limit = max(int(clip_limit * area / 256), 1)
+    luts = np.empty((gy, gx, 256), np.uint8)
+    for cy in range(gy):
+        for cx in range(gx):
+            hist = hists[cy, cx]
+            clipped = int(np.maximum(hist - limit, 0).sum())
+            hist = np.minimum(hist, limit) + clipped // 256
+            residual = clipped % 256
+            if residual:
+                hist[np.arange(0, 256, max(256 // residual, 1))[:residual]] += 1
+            cdf = np.cumsum(hist).astype(np.float32) * np.float32(255.0 / area)
+            luts[cy, cx] = np.clip(np.rint(cdf), 0, 255).astype(np.uint8)
+    return luts, (th, tw)
+
+def clahe_interpolate(L, luts, cell, y0, x0):
+    """Bilinear blend of the four neighbouring cell tables, as OpenCV's CLAHE does"""
+    gy, gx = luts.shape[:2]
+    def axis(start, n, size, cells):
+        f = np.arange(start, start + n, dtype=np.float32) * np.float32(1.0 / size) - np.float32(0.5)
+        i1 = np.floor(f).astype(np.intp)
+        a = (f - i1).astype(np.float32)
+        return np.maximum(i1, 0), np.minimum(i1 + 1, cells - 1), a
+    ty1, ty2, ya = axis(y0, L.shape[0], cell[0], gy)
+    tx1, tx2, xa = axis(x0, L.shape[1], cell[1], gx)
+    Li = L.astype(np.intp)
+    def lut(ty, tx):
+        return luts[ty[:, None], tx[None, :], Li].astype(np.float32)
+    xa, ya = xa[None, :], ya[:, None]
+    res = (lut(ty1, tx1) * (1 - xa) + lut(ty1, tx2) * xa) * (1 - ya) + \
+          (lut(ty2, tx1) * (1 - xa) + lut(ty2, tx2) * xa) * ya
+    return np.clip(np.rint(res), 0, 255).astype(np.uint8)
+
+def lightness(img):
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2LAB)[:, :, 0]
+
+def run_clahe(clip_limit, src, dst, tile):
+    luts, cell = clahe_cell_luts(src, clip_limit, tile)
+    h, w = src.shape[:2]
+    for y0, y1, x0, x1 in tile_ranges(h, w, tile):
+        lab = cv2.cvtColor(as_kind(to_uint8(src[y0:y1, x0:x1]), "bgr"), cv2.COLOR_BGR2LAB)
+        lab[:, :, 0] = clahe_interpolate(lab[:, :, 0], luts, cell, y0, x0)
+        dst[y0:y1, x0:x1] = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+def network_input(src, size):
+    """The L_rs of prepare_lab_image (size x size bilinear sample of the lightness),
+    reading only the rows and columns of src it touches"""
+    h, w = src.shape[:2]
+    y0s, y1s, fy = bilinear_coords(0, size, size, h)
+    x0s, x1s, fx = bilinear_coords(0, size, size, w)
+    rows = np.unique(np.concatenate([y0s, y1s]))
+    cols = np.unique(np.concatenate([x0s, x1s]))
+    sample = lightness(as_kind(to_uint8(np.stack([src[r][cols] for r in rows])), "gray")).astype(np.float32)
+    return np.rint(bilinear(sample, np.searchsorted(rows, y0s), np.searchsorted(rows, y1s), fy,
+                            np.searchsorted(cols, x0s), np.searchsorted(cols, x1s), fx)).astype(np.float32) - 50
+
+def run_pseudocolor(colormap, src, dst, tile):
+    if src.dtype != np.uint16:
+        # 8-bit tiles: each pixel's colour depends on it alone
+        run_neighbourhood(app.pseudocolor, colormap, "gray", src, dst, tile, 0)
+        return
+    # 16-bit data goes straight to the colormap, windowed as app.pseudocolor windows a
+    # whole image (auto_window), from a histogram accumulated tile by tile
+    h, w = src.shape[:2]
+    hist = np.zeros(65536)
+    for y0, y1, x0, x1 in tile_ranges(h, w, tile):
+        hist += cv2.calcHist([gray_tile(src[y0:y1, x0:x1])], [0], None, [65536], [0, 65536]).ravel()
+    window = app.histogram_window(hist)
+    for y0, y1, x0, x1 in tile_ranges(h, w, tile):
+        dst[y0:y1, x0:x1] = app.pseudocolor(gray_tile(src[y0:y1, x0:x1]), colormap, window)
+
+def run_deep(src, dst, tile):
+    h, w = src.shape[:2]
+    if app.colorizer.get() is None:
+        run_neighbourhood(app.pseudocolor, None, "gray", src, dst, tile, 0)
+        return
+    ab = app.predict_ab(network_input(src, app.INFERENCE_SIZE))
+    ah, aw = ab.shape[:2]
+    for y0, y1, x0, x1 in tile_ranges(h, w, tile):
+        # Same source coordinates and weights cv2.resize uses for the whole image
+        ab_tile = bilinear(ab, *bilinear_coords(y0, y1, h, ah), *bilinear_coords(x0, x1, w, aw))
+        lab = np.empty((y1 - y0, x1 - x0, 3), np.uint8)
+        lab[:, :, 0] = lightness(as_kind(to_uint8(src[y0:y1, x0:x1]), "gray"))
+        lab[:, :, 1:] = np.clip(ab_tile + 128.0, 0, 255).astype(np.uint8)
+        dst[y0:y1, x0:x1] = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+def bilinear_coords(start, stop, out_size, in_size):
+    """Source indices and weights for output pixels start..stop of a resize to out_size"""
+    f = ((np.arange(start, stop) + 0.5) * (in_size / out_size) - 0.5).clip(0, in_size - 1)
+    i0 = np.floor(f).astype(np.intp)
+    return i0, np.minimum(i0 + 1, in_size - 1), (f - i0).astype(np.float32)
+
+def bilinear(img, y0, y1, fy, x0, x1, fx):
+    if img.ndim == 3:
+        fx, fy = fx[:, None], fy[:, None, None]
+    else:
+        fy = fy[:, None]
+    top = img[y0][:, x0] * (1 - fx) + img[y0][:, x1] * fx
+    bottom = img[y1][:, x0] * (1 - fx) + img[y1][:, x1] * fx
+    return top * (1 - fy) + bottom * fy
+
+# ---------------------------
+# Driver
+# ---------------------------
+def output_shape(name, src):
+    h, w = src.shape[:2]
+    if name == "ace":
+        return (h, w)
+    return (h, w, 3)
+
+def tile_halo(name, param):
+    """Halo a step's tiles need, or ValueError when the step cannot be tiled"""
+    if name in ("clahe", "deep", "pseudocolor"):
+        return 0
+    halo = halo_for(OPERATIONS[name][0], *param_args(param))
+    if halo is None:
+        if name == "ace":
+            raise ValueError(f"ACE mode '{param[2]}' cannot be tiled: its sampling grid follows the "
+                             f"tile origin, so tiles would not match the whole image (use exact or box)")
+        raise ValueError(f"Operation '{name}' has no tiled implementation")
+    return halo
+
+def run_tiled(steps, src, output_path, workdir, tile=1024, log=print):
+    """Run steps over src one memmap-to-memmap pass at a time; returns the result memmap"""
+    for i, (name, param) in enumerate(steps):
+        last = i == len(steps) - 1
+        path = output_path if last and output_path.lower().endswith(".npy") \
+            else os.path.join(workdir, f"step{i}.npy")
+        dst = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=output_shape(name, src))
+        start = time.perf_counter()
+        func, kind, _ = OPERATIONS[name]
+        if name == "clahe":
+            run_clahe(param, src, dst, tile)
+        elif name == "deep":
+            run_deep(src, dst, tile)
+        elif name == "pseudocolor":
+            run_pseudocolor(param, src, dst, tile)
+        else:
+            run_neighbourhood(func, param, kind, src, dst, tile, tile_halo(name, param))
+        dst.flush()
+        log(f"  {name}: {time.perf_counter() - start:.1f}s")
+        src = dst
+    return src
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process very large images tile by tile through memory-mapped files.")
+    parser.add_argument("input", help="input image (.npy, .tif or any format OpenCV reads)")
+    parser.add_argument("-o", "--output", required=True, help="output .npy (memory-mapped) or image file")
+    parser.add_argument("-p", "--pipeline", default="clahe,pseudocolor", help="ordered operations (see pipeline.py)")
+    parser.add_argument("--tile", type=int, default=1024, help="tile edge in pixels (default: 1024)")
+    parser.add_argument("--workdir", default=None, help="directory for intermediate memmaps (default: temp dir)")
+    parser.add_argument("--dnn-size", type=int, help="deep: network input size in pixels (default: 224)")
+    parser.add_argument("--cache-dir", help="directory for cached network outputs (deep pipelines only)")
+    parser.add_argument("--cache-size", type=float, default=1024, help="ab cache size limit in MB (default: 1024)")
+    args = parser.parse_args(argv)
+
+    try:
+        steps = parse_pipeline(args.pipeline)
+        for name, param in steps:
+            tile_halo(name, param)
+        app.set_deep_defaults(args.dnn_size)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.cache_dir and uses_dnn(steps):
+        app.colorizer.use_cache(args.cache_dir, int(args.cache_size * 2**20))
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        src = open_image(args.input, workdir)
+        print(f"{args.input}: {src.shape[1]}x{src.shape[0]} {src.dtype}, tile {args.tile}px")
+        start = time.perf_counter()
+        result = run_tiled(steps, src, args.output, workdir, args.tile)
+        if not args.output.lower().endswith(".npy"):
+            # Encoders need the whole array; pages come from the memmap, not anonymous memory
+            if not cv2.imwrite(args.output, result):
+                print(f"[ERROR] Unable to write {args.output}")
+                return 1
+        print(f"Done in {time.perf_counter() - start:.1f}s -> {args.output}")
+    if app.colorizer.cache is not None:
+        print(app.colorizer.cache.summary())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
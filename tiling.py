@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+tiling.py
+Row-band execution of the enhancement functions.
+Each band is processed together with a halo of extra rows above and below,
+large enough for the operation's neighbourhood, and only the band's own rows
+are kept. For the operations listed in HALO the stitched result is identical
+to processing the whole image at once.
+process_parallel runs the bands on a thread pool: OpenCV and most NumPy
+operations release the GIL, so one large image uses every core.
+"""
+
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+class CancelledError(Exception):
+    pass
+
+class CancelToken:
+    """Set by the requester, checked by long-running work between bands"""
+    def __init__(self):
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def check(self):
+        if self._cancelled:
+            raise CancelledError()
+
+def _ace_halo(strength=2.0, radius=15, mode="exact"):
+    # Gaussian window of 2*radius+1; the three box passes together reach about radius.
+    # The pyramid mode's sampling grid depends on the band origin, so it cannot be banded.
+    return {"exact": radius, "box": 2 * radius + 3}.get(mode)
+
+def _pseudocolor_halo(colormap=None, window=None):
+    # Without a window, 16-bit input gets its own auto window per call, which would
+    # differ from band to band; callers pass the window of the whole image instead.
+    return 0 if window is not None else None
+
+# Rows of context each operation needs on each side of a band, by function name,
+# or a function of the operation's arguments returning it (None: not bandable).
+# Operations missing here (CLAHE's image-wide tile grid, the DNN) cannot be banded.
+HALO = {
+    "ace_enhancement": _ace_halo,
+    "sharpen": 1,               # 3x3 filter2D
+    "gamma_correction": 0,
+    "saturation_boost": 0,
+    "pseudocolor": _pseudocolor_halo,
+}
+
+def halo_for(func, *args, **kwargs):
+    if isinstance(func, functools.partial):
+        return halo_for(func.func, *func.args, *args, **{**func.keywords, **kwargs})
+    halo = HALO.get(getattr(func, "__name__", None))
+    return halo(*args, **kwargs) if callable(halo) else halo
+
+def can_band(func, *args):
+    return halo_for(func, *args) is not None
+
+def band_ranges(height, band_rows):
+    for y0 in range(0, height, band_rows):
+        yield y0, min(y0 + band_rows, height)
+
+def process_in_bands(func, img, *args, band_rows=256, halo=None, token=None, out=None):
+    """Run func(img, *args) band by band and stitch the results into out.
+    token (a CancelToken) is checked between bands."""
+    if halo is None:
+        halo = halo_for(func, *args)
+    h = img.shape[0]
+    for y0, y1 in band_ranges(h, band_rows):
+        if token is not None:
+            token.check()
+        top, bottom = max(y0 - halo, 0), min(y1 + halo, h)
+        result = func(img[top:bottom], *args)
+        if out is None:
+            out = np.empty((h,) + result.shape[1:], dtype=result.dtype)
+        out[y0:y1] = result[y0 - top:y0 - top + (y1 - y0)]
+    return out
+
+def parallel_band_rows(height, workers, halo, min_rows=64, max_rows=1024):
+    """Band height giving each worker a few bands (for load balance and frequent
+    cancellation checks) while keeping the halo rows small compared to the band"""
+    return max(min(-(-height // (workers * 4)), max_rows), min_rows, 8 * halo)
+
+def process_parallel(func, img, *args, workers=None, band_rows=None, halo=None, token=None, out=None,
+                     executor=None):
+    """process_in_bands with the bands run concurrently on workers threads
+    (default: one per core) and written straight into out, allocated once.
+    Pass executor to reuse a thread pool. OpenCV's own threading stays as set
+    by cv2.setNumThreads; with many workers, 1 avoids oversubscription."""
+    if halo is None:
+        halo = halo_for(func, *args)
+        if halo is None:
+            raise ValueError(f"{getattr(func, '__name__', func)} cannot be split into bands")
+    workers = workers or os.cpu_count() or 1
+    h = img.shape[0]
+    if band_rows is None:
+        band_rows = parallel_band_rows(h, workers, halo)
+    lock = threading.Lock()
+
+    def run_band(y0, y1):
+        nonlocal out
+        if token is not None:
+            token.check()
+        top, bottom = max(y0 - halo, 0), min(y1 + halo, h)
+        result = func(img[top:bottom], *args)
+        with lock:
+            if out is None:
+                out = np.empty((h,) + result.shape[1:], dtype=result.dtype)
+        out[y0:y1] = result[y0 - top:y0 - top + (y1 - y0)]
+
+    bands = list(band_ranges(h, band_rows))
+    if workers == 1 or len(bands) == 1:
+        for band in bands:
+            run_band(*band)
+        return out
+    pool = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix="band")
+    try:
+        futures = [pool.submit(run_band, *band) for band in bands]
+        for future in futures:
+            try:
+                future.result()
+            except BaseException:
+                for f in futures:
+                    f.cancel()
+                raise
+    finally:
+        if executor is None:
+            pool.shutdown()
+    return out
+
+def run_cancellable(func, img, *args, token=None, workers=None):
+    """Band the work when the operation allows it so token can stop it part way;
+    the bands run on workers threads (default: one per core)"""
+    if can_band(func, *args):
+        return process_parallel(func, img, *args, workers=workers, token=token)
+    if token is not None:
+        token.check()
+    return func(img, *args)
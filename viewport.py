@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+viewport.py
+Zoom and pan over very large images at a cost set by the window, not the image.
+- ImagePyramid halves the image (INTER_AREA) down to screen size, once per image
+- Viewport holds the zoom factor and position and maps view pixels to image pixels
+- render_view picks the pyramid level just above the zoom factor and resamples
+  only the visible part of it into a view-sized array, optionally running an
+  enhancement function on that part first (with its halo, see tiling.py)
+- ZoomWindow is the Tk window: mouse wheel zooms around the pointer, dragging
+  pans, 0 fits the image and 1 shows it at 100%. Previews of an operation are
+  processed off the Tk thread for the visible region plus a margin, so panning
+  and redraws reuse the processed region until the view leaves it
+"""
+
+import math
+import tkinter as tk
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+from tiling import halo_for
+
+MAX_ZOOM = 32.0
+# Zooming in further than this shows image pixels as blocks instead of interpolating
+NEAREST_ZOOM = 2.0
+BACKGROUND = 48
+
+class ImagePyramid:
+    def __init__(self, img, min_size=256):
+        """Level 0 is img itself (not copied); each further level is half the size"""
+        self.levels = [img]
+        while max(self.levels[-1].shape[:2]) > min_size:
+            h, w = self.levels[-1].shape[:2]
+            self.levels.append(cv2.resize(self.levels[-1], (max(w // 2, 1), max(h // 2, 1)),
+                                          interpolation=cv2.INTER_AREA))
+
+    @property
+    def image(self):
+        return self.levels[0]
+
+    def level_for(self, zoom):
+        """Smallest level still at least as detailed as the screen at this zoom"""
+        k = int(math.floor(math.log2(1.0 / zoom))) if zoom < 1.0 else 0
+        return min(max(k, 0), len(self.levels) - 1)
+
+class Viewport:
+    """View of view_w x view_h pixels onto an image_w x image_h image.
+    (x0, y0) is the image coordinate at the top-left corner of the view and
+    zoom the number of view pixels per image pixel."""
+    def __init__(self, image_w, image_h, view_w, view_h):
+        self.image_w, self.image_h = image_w, image_h
+        self.view_w, self.view_h = max(view_w, 1), max(view_h, 1)
+        self.fit()
+
+    @property
+    def fit_zoom(self):
+        return min(self.view_w / self.image_w, self.view_h / self.image_h)
+
+    def fit(self):
+        self.zoom = self.fit_zoom
+        self.x0 = self.y0 = 0.0
+        self._clamp()
+
+    def resize(self, view_w, view_h):
+        """Keep the image point at the centre of the view where it is (a fitted image is refitted)"""
+        fitted = math.isclose(self.zoom, self.fit_zoom)
+        cx, cy = self.to_image(self.view_w / 2, self.view_h / 2)
+        self.view_w, self.view_h = max(view_w, 1), max(view_h, 1)
+        if fitted:
+            self.fit()
+            return
+        self.x0, self.y0 = cx - self.view_w / 2 / self.zoom, cy - self.view_h / 2 / self.zoom
+        self._clamp()
+
+    def to_image(self, vx, vy):
+        return self.x0 + vx / self.zoom, self.y0 + vy / self.zoom
+
+    def zoom_at(self, factor, vx, vy):
+        """Zoom by factor keeping the image point under view pixel (vx, vy) in place"""
+        ix, iy = self.to_image(vx, vy)
+        self.zoom = min(max(self.zoom * factor, min(self.fit_zoom, 1.0)), MAX_ZOOM)
+        self.x0, self.y0 = ix - vx / self.zoom, iy - vy / self.zoom
+        self._clamp()
+
+    def set_zoom(self, zoom):
+        self.zoom_at(zoom / self.zoom, self.view_w / 2, self.view_h / 2)
+
+    def pan(self, dx, dy):
+        """Move the image by (dx, dy) view pixels"""
+        self.x0 -= dx / self.zoom
+        self.y0 -= dy / self.zoom
+        self._clamp()
+
+    def _clamp(self):
+        # An image smaller than the view is centred, a larger one cannot leave it
+        for attr, size, view in (("x0", self.image_w, self.view_w), ("y0", self.image_h, self.view_h)):
+            extent = view / self.zoom
+            value = getattr(self, attr)
+            setattr(self, attr, (size - extent) / 2 if extent >= size else min(max(value, 0.0), size - extent))
+
+def visible_rect(level, viewport, margin=0):
+    """(x0, y0, x1, y1) of the visible part of a pyramid level in level pixels, plus
+    one pixel for interpolation and margin pixels, clipped to the level"""
+    vp = viewport
+    lh, lw = level.shape[:2]
+    sx, sy = lw / vp.image_w, lh / vp.image_h
+    return (max(int(math.floor(vp.x0 * sx)) - 1 - margin, 0),
+            max(int(math.floor(vp.y0 * sy)) - 1 - margin, 0),
+            min(int(math.ceil((vp.x0 + vp.view_w / vp.zoom) * sx)) + 1 + margin, lw),
+            min(int(math.ceil((vp.y0 + vp.view_h / vp.zoom) * sy)) + 1 + margin, lh))
+
+def process_region(level, rect, func, *args):
+    """func(region, *args) for rect (x0, y0, x1, y1) of level, computed with the halo
+    tiling.py knows for func so the result matches processing the whole level"""
+    x0, y0, x1, y1 = rect
+    lh, lw = level.shape[:2]
+    halo = halo_for(func, *args) or 0
+    top, left = max(y0 - halo, 0), max(x0 - halo, 0)
+    region = level[top:min(y1 + halo, lh), left:min(x1 + halo, lw)]
+    if not region.size:
+        return region
+    return func(region, *args)[y0 - top:y1 - top, x0 - left:x1 - left]
+
+def warp_region(region, origin, level, viewport):
+    """Resample region, whose top-left pixel is origin (x, y) of level, into the view"""
+    vp = viewport
+    x0, y0 = origin
+    lh, lw = level.shape[:2]
+    sx, sy = lw / vp.image_w, lh / vp.image_h
+    # Region pixel centre r maps to view pixel ((x0 + r + 0.5) / sx - vp.x0) * zoom - 0.5
+    ax, ay = vp.zoom / sx, vp.zoom / sy
+    M = np.float32([[ax, 0, ((x0 + 0.5) / sx - vp.x0) * vp.zoom - 0.5],
+                    [0, ay, ((y0 + 0.5) / sy - vp.y0) * vp.zoom - 0.5]])
+    flags = cv2.INTER_NEAREST if vp.zoom >= NEAREST_ZOOM else cv2.INTER_LINEAR
+    return cv2.warpAffine(region, M, (vp.view_w, vp.view_h), flags=flags,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=(BACKGROUND,) * 3)
+
+def render_view(pyramid, viewport, func=None, args=()):
+    """View-sized image (same channels as the pyramid) of the visible part of the image.
+    func(region, *args), if given, is applied to the visible region of the chosen
+    level first, with the halo tiling.py knows for it."""
+    level = pyramid.levels[pyramid.level_for(viewport.zoom)]
+    rect = visible_rect(level, viewport)
+    region = level[rect[1]:rect[3], rect[0]:rect[2]]
+    if func is not None:
+        region = process_region(level, rect, func, *args)
+    return warp_region(region, rect[:2], level, viewport)
+
+class ZoomWindow:
+    """Toplevel window with a zoomable, pannable view of one image.
+    set_image shows a new result; preview shows an operation applied to the visible
+    part of another image (the source) until the next set_image.
+    submit(job), if given, runs job() on a worker thread and passes its result to
+    show_processed on the Tk thread; without it previews are processed inline."""
+    def __init__(self, master, on_close=None, title="Zoom View", submit=None):
+        self.on_close = on_close
+        self.submit = submit
+        self.top = tk.Toplevel(master)
+        self.top.title(title)
+        self.top.geometry("900x700")
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+        self.canvas = tk.Canvas(self.top, bg="gray19", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        bar = tk.Frame(self.top, bd=1, relief=tk.SUNKEN)
+        bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status = tk.Label(bar, anchor=tk.W)
+        self.status.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.region_preview_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(bar, text="Preview visible region", variable=self.region_preview_var).pack(side=tk.RIGHT)
+        self.pyramid = None
+        self.viewport = None
+        self._preview = None        # (pyramid, op)
+        self._requested = None      # (preview, level index, rect) being processed
+        self._processed = None      # (preview, level index, rect, processed region)
+        self._photo = None
+        self._item = None
+        self._drag = None
+        self.canvas.bind("<Configure>", self.on_configure)
+        self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self.zoom_at(1.25, e.x, e.y))
+        self.canvas.bind("<Button-5>", lambda e: self.zoom_at(0.8, e.x, e.y))
+        self.top.bind("<Key-0>", lambda e: self.fit())
+        self.top.bind("<Key-1>", lambda e: self.actual_size())
+        self.top.bind("<plus>", lambda e: self.zoom_at(1.25))
+        self.top.bind("<minus>", lambda e: self.zoom_at(0.8))
+
+    def set_image(self, img):
+        """Show img, building its pyramid; the view is kept if the size is unchanged"""
+        self._preview = self._requested = self._processed = None
+        if self.pyramid is not None and self.pyramid.image is img:
+            self.render()
+            return
+        self.pyramid = ImagePyramid(img)
+        h, w = img.shape[:2]
+        if self.viewport is None or (self.viewport.image_w, self.viewport.image_h) != (w, h):
+            self.viewport = Viewport(w, h, self.canvas.winfo_width(), self.canvas.winfo_height())
+        self.render()
+
+    def preview(self, pyramid, op):
+        """Show an operation on the visible region of pyramid instead of the current image.
+        op(scale) returns (func, args) for a level of that scale (1 is full resolution),
+        so parameters measured in pixels, like a radius, can follow the level."""
+        if not self.region_preview_var.get():
+            return
+        self._preview = (pyramid, op)
+        self._requested = self._processed = None
+        self.render()
+
+    def cancel_preview(self):
+        """Go back to the current image"""
+        if self._preview is not None:
+            self._preview = self._requested = self._processed = None
+            self.render()
+
+    def show_processed(self, result):
+        """Result of a preview job; results for an older preview are ignored"""
+        if self._store(result):
+            self.render()
+
+    def _store(self, result):
+        key, region = result
+        if key[0] is not self._preview:
+            return False
+        self._processed = key + (region,)
+        if self._requested == key:
+            self._requested = None
+        return True
+
+    @staticmethod
+    def _covers(entry, preview, k, rect):
+        if entry is None or entry[0] is not preview or entry[1] != k:
+            return False
+        x0, y0, x1, y1 = entry[2]
+        return x0 <= rect[0] and y0 <= rect[1] and rect[2] <= x1 and rect[3] <= y1
+
+    def _request(self, preview, k, level):
+        """Process the visible region of level k plus half a view on each side"""
+        vp = self.viewport
+        scale = level.shape[1] / vp.image_w
+        margin = int(math.ceil(max(vp.view_w, vp.view_h) / 2 / vp.zoom * scale))
+        rect = visible_rect(level, vp, margin)
+        func, args = preview[1](scale)
+        key = self._requested = (preview, k, rect)
+        job = lambda: (key, process_region(level, rect, func, *args))
+        if self.submit is None:
+            self._store(job())
+        else:
+            self.submit(job)
+
+    def _render_preview(self):
+        """(view, level index, pending): the processed region when it covers the view,
+        otherwise the unprocessed source until the worker has processed it"""
+        preview = self._preview
+        pyramid = preview[0]
+        vp = self.viewport
+        k = pyramid.level_for(vp.zoom)
+        level = pyramid.levels[k]
+        rect = visible_rect(level, vp)
+        if not self._covers(self._processed, preview, k, rect):
+            if not self._covers(self._requested, preview, k, rect):
+                self._request(preview, k, level)
+            if not self._covers(self._processed, preview, k, rect):
+                return warp_region(level[rect[1]:rect[3], rect[0]:rect[2]], rect[:2], level, vp), k, True
+        x0, y0 = self._processed[2][:2]
+        region = self._processed[3][rect[1] - y0:rect[3] - y0, rect[0] - x0:rect[2] - x0]
+        return warp_region(region, rect[:2], level, vp), k, False
+
+    def render(self):
+        if self.viewport is None:
+            return
+        pending = False
+        if self._preview is not None:
+            view, level, pending = self._render_preview()
+        else:
+            view = render_view(self.pyramid, self.viewport)
+            level = self.pyramid.level_for(self.viewport.zoom)
+        rgb = cv2.cvtColor(view, cv2.COLOR_GRAY2RGB if view.ndim == 2 else cv2.COLOR_BGR2RGB)
+        pil_img = Image.fromarray(rgb)
+        if self._photo is not None and (self._photo.width(), self._photo.height()) == pil_img.size:
+            self._photo.paste(pil_img)
+        else:
+            self._photo = ImageTk.PhotoImage(pil_img)
+            if self._item is None:
+                self._item = self.canvas.create_image(0, 0, anchor=tk.NW, image=self._photo)
+            else:
+                self.canvas.itemconfig(self._item, image=self._photo)
+        vp = self.viewport
+        preview = " | processing preview..." if pending else " | preview of visible region" if self._preview else ""
+        self.status.config(text=f"{vp.image_w}x{vp.image_h} | zoom {vp.zoom:.0%} | level {level}{preview}")
+
+    def fit(self):
+        if self.viewport is not None:
+            self.viewport.fit()
+            self.render()
+
+    def actual_size(self):
+        if self.viewport is not None:
+            self.viewport.set_zoom(1.0)
+            self.render()
+
+    def zoom_at(self, factor, x=None, y=None):
+        if self.viewport is not None:
+            vp = self.viewport
+            vp.zoom_at(factor, vp.view_w / 2 if x is None else x, vp.view_h / 2 if y is None else y)
+            self.render()
+
+    def on_wheel(self, event):
+        self.zoom_at(1.25 if event.delta > 0 else 0.8, event.x, event.y)
+
+    def on_press(self, event):
+        self._drag = (event.x, event.y)
+
+    def on_drag(self, event):
+        if self.viewport is None or self._drag is None:
+            return
+        self.viewport.pan(event.x - self._drag[0], event.y - self._drag[1])
+        self._drag = (event.x, event.y)
+        self.render()
+
+    def on_configure(self, event):
+        if self.viewport is not None:
+            self.viewport.resize(event.width, event.height)
+            self.render()
+
+    def close(self):
+        self.top.destroy()
+        if self.on_close is not None:
+            self.on_close()